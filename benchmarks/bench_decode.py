@@ -0,0 +1,106 @@
+"""Сравнение полного и уменьшенного декодирования по форматам.
+
+Для каждого формата и размера создаётся тестовое изображение, затем в
+отдельном процессе замеряются время декодирования + resize_to_fullhd и
+пиковое потребление памяти.
+
+Запуск: python benchmarks/bench_decode.py [--repeats 5] [--json results.json]
+"""
+import os
+import json
+import time
+import argparse
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+from bench_utils import peak_rss_mb, current_rss_mb, run_isolated
+
+# Глобальные переменные
+SAMPLE_SIZES = [(4000, 3000), (6000, 4000), (8160, 6120)]  # 12, 24 и 50 МП
+SAMPLE_FORMATS = [".jpg", ".png", ".tiff"]
+DECODE_MODES = ["full", "reduced"]
+
+
+def make_sample(path, size):
+    """Создать тестовое изображение с шумом и градиентом (сжимается как фото)."""
+    width, height = size
+    rng = np.random.default_rng(0)
+    gradient = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+    noise = rng.normal(0, 20, (height, width, 3)).astype(np.float32)
+    pixels = np.clip(gradient + noise, 0, 255).astype(np.uint8)
+    image = Image.fromarray(pixels)
+    if path.endswith(".jpg"):
+        image.save(path, quality=90)
+    else:
+        image.save(path)
+
+
+def _measure(path, mode, repeats):
+    """Замерить декодирование (выполняется в отдельном процессе)."""
+    import create_chronological_video as ccv
+
+    baseline_mb = current_rss_mb()
+    width, height = ccv.get_image_dimensions(path)
+    durations = []
+    shape = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        img = ccv.decode_image(path, ccv.TARGET_RESOLUTION, (width, height), mode=mode)
+        decoded_shape = img.shape
+        img = ccv.resize_to_fullhd(img, *ccv.TARGET_RESOLUTION)
+        durations.append(time.perf_counter() - start)
+        shape = decoded_shape
+        del img
+    return {
+        "decode_ms": 1000 * min(durations),
+        "decoded_shape": list(shape),
+        "peak_extra_mb": peak_rss_mb() - baseline_mb,
+    }
+
+
+def run_benchmark(repeats=5, sample_dir=None):
+    """Выполнить замеры для всех форматов, размеров и режимов."""
+    sample_dir = sample_dir or tempfile.mkdtemp(prefix="bench_decode_")
+    os.makedirs(sample_dir, exist_ok=True)
+    results = []
+    for ext in SAMPLE_FORMATS:
+        for size in SAMPLE_SIZES:
+            path = os.path.join(sample_dir, f"sample_{size[0]}x{size[1]}{ext}")
+            if not os.path.exists(path):
+                # Генерация в отдельном процессе, чтобы не раздувать пик памяти замеров
+                run_isolated(make_sample, path, size)
+            row = {"format": ext, "width": size[0], "height": size[1],
+                   "file_mb": os.path.getsize(path) / 1024 / 1024}
+            for mode in DECODE_MODES:
+                row[mode] = run_isolated(_measure, path, mode, repeats)
+            results.append(row)
+    return results
+
+
+def print_report(results):
+    """Вывести таблицу: время и память full против reduced."""
+    print(f"{'format':<7}{'size':>12}{'full ms':>10}{'red. ms':>10}{'speedup':>9}"
+          f"{'full MiB':>10}{'red. MiB':>10}{'saved MiB':>11}")
+    for row in results:
+        full, reduced = row["full"], row["reduced"]
+        speedup = full["decode_ms"] / reduced["decode_ms"] if reduced["decode_ms"] else 0
+        print(f"{row['format']:<7}{row['width']:>6}x{row['height']:<5}"
+              f"{full['decode_ms']:>10.1f}{reduced['decode_ms']:>10.1f}{speedup:>8.2f}x"
+              f"{full['peak_extra_mb']:>10.1f}{reduced['peak_extra_mb']:>10.1f}"
+              f"{full['peak_extra_mb'] - reduced['peak_extra_mb']:>11.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бенчмарк полного и уменьшенного декодирования")
+    parser.add_argument("--repeats", type=int, default=5, help="повторов на замер (берётся лучший)")
+    parser.add_argument("--sample-dir", help="папка для тестовых изображений (по умолчанию временная)")
+    parser.add_argument("--json", help="сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.repeats, args.sample_dir)
+    print_report(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
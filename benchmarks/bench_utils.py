@@ -0,0 +1,46 @@
+"""Общие утилиты бенчмарков: пик памяти и запуск замера в отдельном процессе."""
+import os
+import sys
+import traceback
+import multiprocessing
+
+import psutil
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def peak_rss_mb():
+    """Пиковое потребление памяти текущим процессом (MiB)."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux отдаёт КиБ, macOS — байты
+        return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        return psutil.Process().memory_info().peak_wset / 1024 / 1024
+
+
+def current_rss_mb():
+    """Текущее потребление памяти процессом (MiB)."""
+    return psutil.Process().memory_info().rss / 1024 / 1024
+
+
+def _child_main(func, args, queue):
+    """Выполнить замер в дочернем процессе и вернуть результат через очередь."""
+    try:
+        queue.put(("ok", func(*args)))
+    except Exception:
+        queue.put(("error", traceback.format_exc()))
+
+
+def run_isolated(func, *args):
+    """Выполнить func(*args) в новом процессе (spawn), чтобы пик памяти был его собственным."""
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(target=_child_main, args=(func, args, queue))
+    process.start()
+    status, result = queue.get()
+    process.join()
+    if status != "ok":
+        raise RuntimeError(f"Замер {func.__name__} завершился с ошибкой:\n{result}")
+    return result
@@ -0,0 +1,102 @@
+"""Сравнение профилей кодирования на выборке фотографий.
+
+Кадры готовятся один раз (как при рендере), затем каждый профиль кодирует
+их в отдельный файл. Для каждого профиля выводятся время кодирования,
+размер файла и качество (PSNR относительно исходных кадров).
+
+Запуск: python benchmarks/compare_profiles.py <папка с фото> [--limit 50] [--json results.json]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import create_chronological_video as ccv
+from ffmpeg_tools import ENCODING_PROFILES, FFmpegFrameWriter, get_ffmpeg_binary, get_profile_settings
+
+
+def prepare_sample_frames(root_dir, limit):
+    """Подготовить кадры первых limit фото в хронологическом порядке."""
+    records = ccv.collect_image_records(root_dir)[:limit]
+    metadata = {record.path: record for record in records}
+    frames = []
+    for record in records:
+        prepared = ccv.prepare_frame(record.path, ccv.TARGET_RESOLUTION, metadata)
+        if prepared is not None:
+            frames.append(prepared[0])
+    return frames
+
+
+def read_video_frames(path, size):
+    """Декодировать видео обратно в RGB-кадры."""
+    width, height = size
+    result = subprocess.run(
+        [get_ffmpeg_binary(), "-loglevel", "error", "-i", path, "-f", "rawvideo", "-pix_fmt", "rgb24", "-"],
+        capture_output=True, check=True
+    )
+    return np.frombuffer(result.stdout, dtype=np.uint8).reshape(-1, height, width, 3)
+
+
+def psnr(reference, decoded):
+    """PSNR двух кадров (дБ)."""
+    mse = np.mean((reference.astype(np.float32) - decoded.astype(np.float32)) ** 2)
+    return float("inf") if mse == 0 else 10 * np.log10(255 ** 2 / mse)
+
+
+def compare_profile(profile_name, frames, output_dir):
+    """Закодировать кадры профилем и оценить время, размер и качество."""
+    settings = get_profile_settings(profile_name, ccv.PHOTO_DURATION, ccv.FPS, ccv.BITRATE)
+    output_path = os.path.join(output_dir, f"profile_{profile_name}.mp4")
+    start = time.perf_counter()
+    with FFmpegFrameWriter(output_path, ccv.TARGET_RESOLUTION, settings["stream_fps"],
+                           preset=settings["preset"], bitrate=settings["bitrate"],
+                           ffmpeg_params=settings["params"]) as writer:
+        for frame in frames:
+            writer.write_frame(frame, repeat=settings["frames_per_photo"])
+    encode_seconds = time.perf_counter() - start
+
+    decoded = read_video_frames(output_path, ccv.TARGET_RESOLUTION)
+    # Сравниваем первый кадр каждого фото с исходным
+    scores = [psnr(frame, decoded[i * settings["frames_per_photo"]])
+              for i, frame in enumerate(frames) if i * settings["frames_per_photo"] < len(decoded)]
+    return {
+        "profile": profile_name,
+        "photos": len(frames),
+        "encode_seconds": encode_seconds,
+        "photos_per_second": len(frames) / encode_seconds if encode_seconds else 0,
+        "size_mb": os.path.getsize(output_path) / 1024 / 1024,
+        "psnr_mean_db": float(np.mean(scores)) if scores else None,
+        "psnr_min_db": float(np.min(scores)) if scores else None,
+    }
+
+
+def print_report(results):
+    """Вывести таблицу сравнения профилей."""
+    print(f"{'profile':<12}{'encode s':>10}{'photos/s':>10}{'size MiB':>10}{'PSNR avg':>10}{'PSNR min':>10}")
+    for row in results:
+        print(f"{row['profile']:<12}{row['encode_seconds']:>10.2f}{row['photos_per_second']:>10.2f}"
+              f"{row['size_mb']:>10.2f}{row['psnr_mean_db']:>10.2f}{row['psnr_min_db']:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сравнение профилей кодирования")
+    parser.add_argument("root", help="папка с фотографиями для выборки")
+    parser.add_argument("--limit", type=int, default=50, help="сколько фото взять в выборку")
+    parser.add_argument("--profiles", nargs="+", default=list(ENCODING_PROFILES), help="профили для сравнения")
+    parser.add_argument("--json", help="сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    sample_frames = prepare_sample_frames(args.root, args.limit)
+    with tempfile.TemporaryDirectory(prefix="compare_profiles_") as temp_dir:
+        results = [compare_profile(name, sample_frames, temp_dir) for name in args.profiles]
+    print_report(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,260 @@
+"""Набор бенчмарков по этапам на синтетическом архиве Google Takeout.
+
+Каждый этап (сканирование, декодирование + масштабирование, наложение
+текста, кодирование, склейка частей и рендер части целиком) выполняется
+в отдельном процессе. Для этапа сохраняются фото/с и пик памяти, чтобы
+сравнивать версии между собой.
+
+Запуск: python benchmarks/run_benchmarks.py [--photos 300] [--json results.json]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import platform
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+
+from bench_utils import peak_rss_mb, current_rss_mb, run_isolated
+from synthetic_takeout import generate_takeout
+
+# Глобальные переменные
+STAGES = ["scan", "scan_indexed", "decode_resize", "overlay", "encode", "concatenate", "render_part"]
+ENCODE_SAMPLE_FRAMES = 16  # Разных кадров для этапа кодирования (далее повторяются)
+CONCAT_PARTS = 8  # Частей для этапа склейки
+
+
+def _quiet():
+    """Оставить в логах только предупреждения и ошибки."""
+    logging.getLogger().setLevel(logging.WARNING)
+
+
+def _records(root_dir, limit=None):
+    """Записи архива в хронологическом порядке (без индекса, без замера)."""
+    import create_chronological_video as ccv
+    records = ccv.collect_image_records(root_dir, use_index=False)
+    return records[:limit] if limit else records
+
+
+def _result(photos, seconds, baseline_mb):
+    """Результат этапа: фото/с и память."""
+    return {
+        "photos": photos,
+        "seconds": round(seconds, 4),
+        "photos_per_second": round(photos / seconds, 2) if seconds else None,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "baseline_rss_mb": round(baseline_mb, 1),
+    }
+
+
+def bench_scan(root_dir, work_dir, limit):
+    """collect_image_records без индекса."""
+    import create_chronological_video as ccv
+    _quiet()
+    baseline_mb = current_rss_mb()
+    start = time.perf_counter()
+    records = ccv.collect_image_records(root_dir, use_index=False)
+    return _result(len(records), time.perf_counter() - start, baseline_mb)
+
+
+def bench_scan_indexed(root_dir, work_dir, limit):
+    """collect_image_records с заполненным индексом (повторный запуск)."""
+    import create_chronological_video as ccv
+    _quiet()
+    index_path = os.path.join(work_dir, "bench_index.sqlite3")
+    if os.path.exists(index_path):
+        os.remove(index_path)
+    ccv.collect_image_records(root_dir, index_path=index_path)
+    baseline_mb = current_rss_mb()
+    start = time.perf_counter()
+    records = ccv.collect_image_records(root_dir, index_path=index_path)
+    return _result(len(records), time.perf_counter() - start, baseline_mb)
+
+
+def bench_decode_resize(root_dir, work_dir, limit):
+    """decode_image + letterbox_into (масштабирование и цвет сразу в кадре)."""
+    import cv2
+    import create_chronological_video as ccv
+    _quiet()
+    records = _records(root_dir, limit)
+    canvas = ccv.new_canvas(ccv.TARGET_RESOLUTION)
+    baseline_mb = current_rss_mb()
+    start = time.perf_counter()
+    for record in records:
+        img = ccv.decode_image(record.path, ccv.TARGET_RESOLUTION, (record.width, record.height))
+        ccv.letterbox_into(img, canvas, cv2.COLOR_BGR2RGB)
+    return _result(len(records), time.perf_counter() - start, baseline_mb)
+
+
+def bench_overlay(root_dir, work_dir, limit):
+    """add_text_to_image на кадре целевого размера."""
+    import numpy as np
+    import create_chronological_video as ccv
+    _quiet()
+    records = _records(root_dir, limit)
+    width, height = ccv.TARGET_RESOLUTION
+    frame = np.full((height, width, 3), 96, dtype=np.uint8)
+    baseline_mb = current_rss_mb()
+    start = time.perf_counter()
+    for record in records:
+        ccv.add_text_to_image(frame, record.text)
+    return _result(len(records), time.perf_counter() - start, baseline_mb)
+
+
+def _sample_frames(records):
+    """Подготовить несколько кадров для этапов кодирования."""
+    import create_chronological_video as ccv
+    metadata = {record.path: record for record in records}
+    frames = []
+    for record in records[:ENCODE_SAMPLE_FRAMES]:
+        prepared = ccv.prepare_frame(record.path, ccv.TARGET_RESOLUTION, metadata)
+        if prepared is not None:
+            frames.append(prepared[0])
+    return frames
+
+
+def _encode(frames, photos, output_path):
+    """Закодировать photos фото, циклически повторяя кадры."""
+    import create_chronological_video as ccv
+    from ffmpeg_tools import FFmpegFrameWriter
+    encoding = ccv.get_encoding_settings()
+    with FFmpegFrameWriter(output_path, ccv.TARGET_RESOLUTION, encoding["stream_fps"],
+                           preset=encoding["preset"], bitrate=encoding["bitrate"],
+                           ffmpeg_params=encoding["params"], threads=ccv.ENCODER_THREADS) as writer:
+        for i in range(photos):
+            writer.write_frame(frames[i % len(frames)], repeat=encoding["frames_per_photo"])
+
+
+def bench_encode(root_dir, work_dir, limit):
+    """Кодирование готовых кадров в ffmpeg (профиль ENCODING_PROFILE)."""
+    _quiet()
+    records = _records(root_dir, limit)
+    frames = _sample_frames(records)
+    output_path = os.path.join(work_dir, "bench_encode.mp4")
+    baseline_mb = current_rss_mb()
+    start = time.perf_counter()
+    _encode(frames, len(records), output_path)
+    seconds = time.perf_counter() - start
+    os.remove(output_path)
+    return _result(len(records), seconds, baseline_mb)
+
+
+def bench_concatenate(root_dir, work_dir, limit):
+    """concatenate_videos на CONCAT_PARTS частях."""
+    import create_chronological_video as ccv
+    import concatenate_videos
+    _quiet()
+    records = _records(root_dir, limit)
+    frames = _sample_frames(records)
+    parts_dir = os.path.join(work_dir, "bench_concat")
+    shutil.rmtree(parts_dir, ignore_errors=True)
+    os.makedirs(parts_dir)
+    per_part = max(1, len(records) // CONCAT_PARTS)
+    for part_number in range(1, CONCAT_PARTS + 1):
+        first = records[(part_number - 1) * per_part % len(records)].timestamp
+        path = ccv.build_output_path(parts_dir, part_number, first, first, per_part)
+        _encode(frames, per_part, path)
+
+    concatenate_videos.RESULTS_FOLDER_PATH = parts_dir
+    baseline_mb = current_rss_mb()
+    start = time.perf_counter()
+    concatenate_videos.concatenate_videos()
+    seconds = time.perf_counter() - start
+    shutil.rmtree(parts_dir, ignore_errors=True)
+    return _result(per_part * CONCAT_PARTS, seconds, baseline_mb)
+
+
+def bench_render_part(root_dir, work_dir, limit):
+    """create_video_part целиком: подготовка кадров и кодирование."""
+    import create_chronological_video as ccv
+    _quiet()
+    records = _records(root_dir, limit)
+    output_dir = os.path.join(work_dir, "bench_render")
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.makedirs(output_dir)
+    baseline_mb = current_rss_mb()
+    start = time.perf_counter()
+    ccv.create_video_part([record.path for record in records], 1, output_dir,
+                          photo_duration=ccv.PHOTO_DURATION, target_resolution=ccv.TARGET_RESOLUTION,
+                          batch_size=ccv.BATCH_SIZE, metadata={record.path: record for record in records})
+    seconds = time.perf_counter() - start
+    shutil.rmtree(output_dir, ignore_errors=True)
+    return _result(len(records), seconds, baseline_mb)
+
+
+STAGE_FUNCTIONS = {
+    "scan": bench_scan,
+    "scan_indexed": bench_scan_indexed,
+    "decode_resize": bench_decode_resize,
+    "overlay": bench_overlay,
+    "encode": bench_encode,
+    "concatenate": bench_concatenate,
+    "render_part": bench_render_part,
+}
+
+
+def get_git_revision():
+    """Текущий коммит репозитория (для сравнения версий)."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def run_benchmarks(root_dir, work_dir, stages=STAGES, limit=None):
+    """Выполнить этапы в отдельных процессах и собрать отчёт."""
+    report = {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "git_revision": get_git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "root_dir": root_dir,
+            "limit": limit,
+        },
+        "stages": {},
+    }
+    for stage in stages:
+        report["stages"][stage] = run_isolated(STAGE_FUNCTIONS[stage], root_dir, work_dir, limit)
+    return report
+
+
+def print_report(report):
+    """Вывести таблицу по этапам."""
+    print(f"{'stage':<15}{'photos':>8}{'seconds':>10}{'photos/s':>11}{'peak MiB':>10}")
+    for stage, row in report["stages"].items():
+        print(f"{stage:<15}{row['photos']:>8}{row['seconds']:>10.2f}"
+              f"{row['photos_per_second'] or 0:>11.1f}{row['peak_rss_mb']:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бенчмарк этапов на синтетическом архиве Takeout")
+    parser.add_argument("--root", help="готовый архив (по умолчанию генерируется синтетический)")
+    parser.add_argument("--work-dir", help="рабочая папка (по умолчанию временная)")
+    parser.add_argument("--photos", type=int, default=300, help="фото в синтетическом архиве")
+    parser.add_argument("--seed", type=int, default=1, help="зерно синтетического архива")
+    parser.add_argument("--limit", type=int, help="ограничить число фото для этапов после сканирования")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES, help="какие этапы выполнить")
+    parser.add_argument("--json", help="сохранить отчёт в JSON")
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="photo_bench_")
+    os.makedirs(work_dir, exist_ok=True)
+    root_dir = args.root
+    if not root_dir:
+        root_dir = os.path.join(work_dir, f"takeout_{args.photos}_{args.seed}")
+        if not os.path.isdir(root_dir):
+            print(f"Генерация синтетического архива ({args.photos} фото): {root_dir}", file=sys.stderr)
+            run_isolated(generate_takeout, root_dir, args.photos, args.seed)
+
+    result = run_benchmarks(root_dir, work_dir, args.stages, args.limit)
+    print_report(result)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
@@ -0,0 +1,103 @@
+"""Генератор синтетического архива Google Takeout для бенчмарков.
+
+Создаёт дерево альбомов с фотографиями разных форматов и разрешений,
+именами в стилях IMG_YYYYMMDD_HHMMSS, FB_IMG_<ms> и произвольными, а
+также JSON-файлами с photoTakenTime/creationTime/geoData.
+
+Запуск: python benchmarks/synthetic_takeout.py <папка> [--photos 500] [--seed 1]
+"""
+import os
+import json
+import random
+import argparse
+from datetime import datetime, timedelta
+
+import cv2
+import numpy as np
+
+# Глобальные переменные
+RESOLUTIONS = [(4032, 3024), (3024, 4032), (4000, 2250), (1920, 1080), (1280, 960), (640, 480)]
+FORMAT_WEIGHTS = {".jpg": 0.85, ".png": 0.08, ".tiff": 0.04, ".bmp": 0.03}
+NAME_STYLE_WEIGHTS = {"img": 0.55, "fb": 0.15, "other": 0.30}
+SIDECAR_RATIO = 0.7  # Доля фото с JSON-файлом
+GEO_RATIO = 0.5  # Доля JSON с координатами
+START_DATE = datetime(2015, 1, 1)
+END_DATE = datetime(2024, 12, 31)
+
+
+def make_pixels(rng, size):
+    """Синтетическое «фото»: плавные пятна и шум, сжимается примерно как реальный снимок."""
+    width, height = size
+    base = rng.integers(0, 256, (12, 16, 3), dtype=np.uint8)
+    pixels = cv2.resize(base, (width, height), interpolation=cv2.INTER_CUBIC)
+    noise = rng.integers(-12, 13, (64, 64, 3), dtype=np.int16)
+    tiled = np.tile(noise, (height // 64 + 1, width // 64 + 1, 1))[:height, :width]
+    return np.clip(pixels.astype(np.int16) + tiled, 0, 255).astype(np.uint8)
+
+
+def make_filename(rnd, style, taken, ext, index):
+    """Имя файла в одном из стилей Takeout."""
+    if style == "img" and ext == ".jpg":
+        suffix = "_HDR" if rnd.random() < 0.1 else ""
+        return f"IMG_{taken:%Y%m%d_%H%M%S}{rnd.randint(0, 999):03d}{suffix}.jpg"
+    if style == "fb" and ext == ".jpg":
+        return f"FB_IMG_{int(taken.timestamp() * 1000)}.jpg"
+    name = rnd.choice(["DSC", "photo", "Screenshot", "received", "image"])
+    return f"{name}{index:05d}{ext}" if rnd.random() < 0.5 else f"{name} ({index}){ext}"
+
+
+def make_sidecar(rnd, taken):
+    """Содержимое JSON-файла Takeout."""
+    created = taken + timedelta(days=rnd.randint(0, 400))
+    data = {
+        "title": "",
+        "photoTakenTime": {"timestamp": str(int(taken.timestamp()))},
+        "creationTime": {"timestamp": str(int(created.timestamp()))},
+        "geoData": {"latitude": 0.0, "longitude": 0.0, "altitude": 0.0},
+    }
+    if rnd.random() < GEO_RATIO:
+        data["geoData"]["latitude"] = round(rnd.uniform(-60, 70), 6)
+        data["geoData"]["longitude"] = round(rnd.uniform(-180, 180), 6)
+    return data
+
+
+def generate_takeout(root_dir, photos=500, seed=1, resolutions=None):
+    """Сгенерировать синтетический архив и вернуть список созданных фото."""
+    rnd = random.Random(seed)
+    rng = np.random.default_rng(seed)
+    resolutions = resolutions or RESOLUTIONS
+    span = (END_DATE - START_DATE).total_seconds()
+    created = []
+    used_names = set()
+    for index in range(photos):
+        taken = START_DATE + timedelta(seconds=rnd.uniform(0, span))
+        album = os.path.join(root_dir, "Takeout", "Google Photos", f"Photos from {taken.year}")
+        os.makedirs(album, exist_ok=True)
+
+        ext = rnd.choices(list(FORMAT_WEIGHTS), weights=list(FORMAT_WEIGHTS.values()))[0]
+        style = rnd.choices(list(NAME_STYLE_WEIGHTS), weights=list(NAME_STYLE_WEIGHTS.values()))[0]
+        filename = make_filename(rnd, style, taken, ext, index)
+        path = os.path.join(album, filename)
+        if path in used_names:
+            continue
+        used_names.add(path)
+
+        size = rnd.choice(resolutions)
+        bgr = make_pixels(rng, size)
+        params = [cv2.IMWRITE_JPEG_QUALITY, 90] if ext == ".jpg" else []
+        cv2.imwrite(path, bgr, params)
+        if rnd.random() < SIDECAR_RATIO:
+            with open(f"{path}.json", "w", encoding="utf-8") as f:
+                json.dump(make_sidecar(rnd, taken), f)
+        created.append(path)
+    return created
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Генератор синтетического архива Google Takeout")
+    parser.add_argument("root", help="папка, в которой создать архив")
+    parser.add_argument("--photos", type=int, default=500, help="количество фото")
+    parser.add_argument("--seed", type=int, default=1, help="зерно генератора (архив воспроизводим)")
+    args = parser.parse_args()
+    files = generate_takeout(args.root, args.photos, args.seed)
+    print(f"Создано фото: {len(files)} в {args.root}")
@@ -4,6 +4,8 @@ import re
 import logging
 import psutil
 from moviepy.editor import VideoFileClip, concatenate_videoclips
+from ffmpeg_tools import (check_stream_copy_compatible, concat_stream_copy,
+                          get_profile_settings, moviepy_encoder_kwargs)
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -13,6 +15,9 @@ RESULTS_FOLDER_PATH = os.path.join(os.getcwd(), "data/results")
 OUTPUT_FILENAME_TEMPLATE = "{year}_{total_photos}-photos.mp4"
 BITRATE = "12M"  # Соответствует основному скрипту
 FPS = 1  # Соответствует основному скрипту
+PHOTO_DURATION = 2.0  # Соответствует основному скрипту
+ENCODING_PROFILE = "cbr"  # Профиль перекодирования: "cbr", "crf", "stillimage" или "vfr"
+CONCAT_MODE = "auto"  # "auto" — без перекодирования (-c copy), если параметры частей совпадают; "reencode" — всегда перекодировать
 
 def log_memory_usage():
     """Логировать использование памяти."""
@@ -62,10 +67,35 @@ def concatenate_videos():
         logging.error("Нет подходящих видео для конкатенации.")
         return
 
-    # Загрузка и конкатенация
+    # Формирование имени выходного файла
+    output_filename = OUTPUT_FILENAME_TEMPLATE.format(
+        year=first_year or "unknown",
+        total_photos=total_photos
+    )
+    output_path = os.path.join(RESULTS_FOLDER_PATH, output_filename)
+    video_paths = [file_path for file_path, _ in videos]
+
+    if CONCAT_MODE == "auto":
+        compatible, reason = check_stream_copy_compatible(video_paths)
+        if compatible:
+            try:
+                logging.info(f"Склейка без перекодирования: {output_path}")
+                concat_stream_copy(video_paths, output_path)
+                file_size_mb = os.path.getsize(output_path) / (1024 * 1024)
+                logging.info(f"Объединённое видео сохранено: {output_path} ({file_size_mb:.2f} MiB)")
+                return output_path
+            except Exception as e:
+                logging.error(f"Ошибка склейки без перекодирования, переходим к перекодированию: {e}")
+        else:
+            logging.warning(f"Параметры частей различаются, требуется перекодирование: {reason}")
+
+    return concatenate_reencode(video_paths, output_path)
+
+def concatenate_reencode(video_paths, output_path):
+    """Конкатенировать видео с перекодированием через moviepy."""
     clips = []
     try:
-        for file_path, _ in videos:
+        for file_path in video_paths:
             logging.info(f"Загрузка видео: {file_path}")
             clip = VideoFileClip(file_path)
             clips.append(clip)
@@ -74,31 +104,20 @@ def concatenate_videos():
         logging.info("Конкатенация видео...")
         final_clip = concatenate_videoclips(clips, method="compose")
 
-        # Формирование имени выходного файла
-        output_filename = OUTPUT_FILENAME_TEMPLATE.format(
-            year=first_year or "unknown",
-            total_photos=total_photos
-        )
-        output_path = os.path.join(RESULTS_FOLDER_PATH, output_filename)
-
         # Сохранение результата
         logging.info(f"Сохранение объединённого видео: {output_path}")
-        final_clip.write_videofile(
-            output_path,
-            codec="libx264",
-            fps=FPS,
-            audio=False,
-            ffmpeg_params=["-an", "-b:v", BITRATE],
-            preset="medium"
-        )
+        encoding = get_profile_settings(ENCODING_PROFILE, PHOTO_DURATION, FPS, BITRATE)
+        final_clip.write_videofile(output_path, **moviepy_encoder_kwargs(encoding))
         final_clip.close()
         logging.info(f"Объединённое видео сохранено: {output_path}")
 
         file_size_mb = os.path.getsize(output_path) / (1024 * 1024)
         logging.info(f"Размер видео: {file_size_mb:.2f} MiB")
+        return output_path
 
     except Exception as e:
         logging.error(f"Ошибка при конкатенации: {e}")
+        return None
     finally:
         for clip in clips:
             clip.close()
@@ -3,14 +3,38 @@ import glob
 import shutil
 import re
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
 import cv2
 import numpy as np
 from moviepy.editor import ImageClip, concatenate_videoclips, VideoFileClip
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image
 import logging
 import psutil
 import gc
+import threading
+import time
+import argparse
+from collections import deque, Counter
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import closing, nullcontext
+from functools import partial
+from ffmpeg_tools import (FFmpegFrameWriter, check_stream_copy_compatible, concat_stream_copy,
+                          parse_bitrate, get_profile_settings, moviepy_encoder_kwargs)
+from frame_pipeline import CanvasPool, iter_ordered
+from text_overlay import draw_text_overlay
+from image_header import read_image_header
+from dedup import find_duplicates
+from frame_cache import FrameCache, frame_cache_key
+from read_ahead import ReadAhead
+from run_metrics import METRICS, PartProgress, format_duration
+from part_manifest import (MANIFEST_VERSION, files_digest, content_digest, settings_digest, load_manifest,
+                           save_manifest, save_part_status, save_run_report, save_dedup_report, load_part_statuses,
+                           clear_part_statuses, clear_output_dir, mark_part_complete, is_part_complete,
+                           MANIFEST_FILENAME, PART_RESULT_KEYS)
+from metadata_index import (FileRecord, IndexedRecords, open_index, load_records, load_records_for_paths,
+                            begin_scan_order, add_scan_order, delete_unscanned_records, is_record_fresh,
+                            save_records, delete_missing_records)
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -28,12 +52,47 @@ TEXT_STROKE_COLOR = (0, 0, 0)  # Чёрный (RGB)
 TEXT_STROKE_WIDTH = 1
 MAX_FILE_SIZE_MB = 1000  # Лимит размера видео (~1 ГБ)
 MAX_CLIPS_PER_PART = 1200  # Максимум клипов на часть (300 ~ 10 минут)
+PART_SPLIT_BY = None  # Границы частей по календарю: None, "month" или "year"
+SIZE_ESTIMATE_MARGIN = 1.02  # Запас на контейнер MP4 при прогнозе размера части
 TARGET_RESOLUTION = (1920, 1080)  # FullHD
 PHOTO_DURATION = 2.0  # Длительность изображения
 BATCH_SIZE = 10  # Размер батча
 FPS = 1  # Частота кадров
-BITRATE = "12M"  # Битрейт (~12 Мбит/с)
+BITRATE = "12M"  # Битрейт (~12 Мбит/с); для профилей с CRF — потолок битрейта
+ENCODING_PROFILE = "cbr"  # "cbr", "crf", "stillimage" или "vfr" (см. ENCODING_PROFILES в ffmpeg_tools.py)
 OUTPUT_FILENAME_TEMPLATE = "{first_date}_{last_date}_{num_photos}-photos_{part_number:03d}.mp4"
+USE_METADATA_INDEX = True  # Кэшировать метаданные файлов между запусками
+METADATA_INDEX_PATH = os.path.join(os.getcwd(), "data/metadata_index.sqlite3")  # Вне RESULTS_FOLDER_PATH
+SCAN_WORKERS = 8  # Потоков/процессов для сканирования (1 — последовательно)
+SCAN_EXECUTOR = "thread"  # "thread" — для медленных дисков и сети, "process" — для разбора на всех ядрах
+SCAN_CHUNK_SIZE = 256  # Файлов на задачу для пула процессов
+STREAMING_ORDER = False  # Для миллионов файлов: порядок хранится и сортируется в индексе на диске, а не в памяти
+STREAM_CHUNK_SIZE = 5000  # Файлов за одну порцию потокового сканирования
+RENDER_ENGINE = "ffmpeg"  # "ffmpeg" — кадры напрямую в один процесс ffmpeg, "moviepy" — прежний путь через PNG и батчи
+FRAME_WORKERS = os.cpu_count() or 1  # Потоков подготовки кадров (чтение, масштабирование, текст)
+MAX_FRAMES_IN_FLIGHT = 2 * FRAME_WORKERS  # Максимум кадров в очереди перед кодировщиком
+READ_AHEAD_MB = 128  # Бюджет упреждающего чтения файлов впереди рендера (0 — читать по одному при декодировании)
+READ_AHEAD_WORKERS = 4  # Одновременных чтений (больше — для сетевых папок с высокой задержкой)
+DECODE_MODE = "reduced"  # "reduced" — JPEG декодируется сразу в уменьшенном размере, "full" — всегда полный размер
+REDUCED_DECODE_EXTENSIONS = {'.jpg', '.jpeg'}  # Форматы с уменьшением при декодировании (DCT)
+RESUME = True  # Продолжить прерванный запуск: готовые части из манифеста не пересоздаются
+VERIFY_CHECKSUMS_ON_RESUME = True  # Сверять SHA-256 готовых частей при продолжении
+INCREMENTAL = True  # При изменении архива пересоздавать только затронутые части, остальные файлы сохраняются
+MAX_CONCURRENT_PARTS = 1  # Частей (процессов ffmpeg) рендерится одновременно
+WORKER_MEMORY_LIMIT_MB = None  # Бюджет памяти на процесс рендера (None — без ограничения)
+ENCODER_THREADS = None  # Потоков libx264 на часть (None — решает ffmpeg)
+PREVIEW_FOLDER_PATH = os.path.join(os.getcwd(), "data/preview")  # Папка предпросмотра (--preview), отдельно от результатов
+PREVIEW_RESOLUTION = (480, 270)  # Разрешение предпросмотра; текст масштабируется пропорционально
+PREVIEW_ENCODING_PROFILE = "preview"  # ultrafast, один кадр на фото (см. ENCODING_PROFILES)
+PREVIEW_BITRATE = "1M"  # Потолок битрейта предпросмотра
+PREVIEW_MAX_CLIPS_PER_PART = 5000  # Предпросмотр года обычно помещается в один файл
+FRAME_CACHE = False  # Кэшировать готовые кадры между запусками (смена битрейта, профиля или разбиения не требует их пересчёта)
+FRAME_CACHE_DIR = os.path.join(os.getcwd(), "data/frame_cache")  # Вне RESULTS_FOLDER_PATH
+FRAME_CACHE_MAX_MB = 20000  # Бюджет кэша кадров на диске; давно не использованные кадры вытесняются
+FRAME_CACHE_STORAGE = "png"  # "png" — сжатые кадры, "raw" — несжатые .npy с чтением через memory map
+DEDUP = False  # Пропускать точные копии и почти одинаковые снимки серий (см. dedup.py)
+DEDUP_THRESHOLD = 4  # Максимум различающихся бит dHash (из 64), чтобы снимки считались одинаковыми
+DEDUP_TIME_WINDOW = 10  # Секунд между снимками, которые сравниваются по dHash (серии)
 
 
 def parse_filename_timestamp(file_path):
@@ -48,7 +107,7 @@ def parse_filename_timestamp(file_path):
         try:
             return int(int(timestamp_ms) / 1000)  # Миллисекунды в секунды
         except ValueError as e:
-            logging.warning(f"Некорректный timestamp в имени {filename}: {e}")
+            logging.debug(f"Некорректный timestamp в имени {filename}: {e}")
             return None
 
     # Формат IMG_YYYYMMDD_HHMMSSXXX[_HDR].jpg
@@ -60,7 +119,7 @@ def parse_filename_timestamp(file_path):
             dt = datetime.strptime(f"{date_str} {time_str}", "%Y%m%d %H%M%S")
             return int(dt.timestamp())
         except ValueError as e:
-            logging.warning(f"Некорректный формат даты/времени в имени {filename}: {e}")
+            logging.debug(f"Некорректный формат даты/времени в имени {filename}: {e}")
             return None
 
     name_lst = filename.split('_')
@@ -73,7 +132,7 @@ def parse_filename_timestamp(file_path):
             dt = datetime.strptime(f"{date_str} {time_str}", "%Y%m%d %H%M%S")
             return int(dt.timestamp())
         except ValueError as e:
-            logging.warning(f"Некорректный формат даты/времени в имени {filename}: {e}")
+            logging.debug(f"Некорректный формат даты/времени в имени {filename}: {e}")
             return None
 
     return None
@@ -109,27 +168,39 @@ def get_creation_time(file_path):
         logging.error(f"Ошибка при получении времени создания {file_path}: {e}")
         return 0
 
-def get_file_timestamp(file_path):
-    """Получить timestamp файла с приоритетом: имя > JSON > getctime."""
+def get_file_timestamp_with_source(file_path, header=None):
+    """Получить timestamp файла и его источник ("name", "json", "exif", "ctime").
+
+    header — уже прочитанный заголовок (ImageHeader), чтобы не открывать файл повторно.
+    """
     timestamp = parse_filename_timestamp(file_path)
     if timestamp:
-        logging.info(f"Timestamp из имени {file_path}: {datetime.fromtimestamp(timestamp)}")
-        return timestamp
+        logging.debug(f"Timestamp из имени {file_path}: {datetime.fromtimestamp(timestamp)}")
+        return timestamp, "name"
 
     timestamp = get_json_timestamp(file_path)
     if timestamp:
-        logging.info(f"Timestamp из JSON {file_path}: {datetime.fromtimestamp(timestamp)}")
-        return timestamp
+        logging.debug(f"Timestamp из JSON {file_path}: {datetime.fromtimestamp(timestamp)}")
+        return timestamp, "json"
+
+    timestamp = (header or read_image_header(file_path)).timestamp
+    if timestamp:
+        logging.debug(f"Timestamp из EXIF {file_path}: {datetime.fromtimestamp(timestamp)}")
+        return timestamp, "exif"
 
     timestamp = get_creation_time(file_path)
-    logging.info(f"Timestamp из getctime {file_path}: {datetime.fromtimestamp(timestamp)}")
-    return timestamp
+    logging.debug(f"Timestamp из getctime {file_path}: {datetime.fromtimestamp(timestamp)}")
+    return timestamp, "ctime"
+
+def get_file_timestamp(file_path):
+    """Получить timestamp файла с приоритетом: имя > JSON > EXIF > getctime."""
+    return get_file_timestamp_with_source(file_path)[0]
 
 def get_json_text_data(file_path):
     """Извлечь данные для текста из JSON-файла."""
     json_path = f"{file_path}.json"
     if not os.path.exists(json_path):
-        logging.warning(f"JSON-файл не найден для {file_path}")
+        logging.debug(f"JSON-файл не найден для {file_path}")
         return ""
 
     try:
@@ -154,141 +225,687 @@ def get_json_text_data(file_path):
         logging.error(f"Ошибка чтения JSON {json_path}: {e}")
         return ""
 
+def get_overlay_text(file_path, exif_timestamp=None):
+    """Получить текст для наложения: данные JSON, иначе дата из имени файла или EXIF."""
+    text = get_json_text_data(file_path)
+    if not text:
+        text = get_text_timestamp_from_filename(file_path)
+    if not text and exif_timestamp:
+        text = datetime.fromtimestamp(exif_timestamp).strftime(TEXT_DATE_FORMAT)
+    return text
+
+def get_image_dimensions(file_path, header=None):
+    """Получить размеры изображения по заголовку, без декодирования пикселей."""
+    header = header or read_image_header(file_path)
+    if header.width and header.height:
+        return header.width, header.height
+    # Формат, который не разбирает read_image_header: заголовок читает Pillow
+    try:
+        with Image.open(file_path) as image:
+            return image.size
+    except Exception as e:
+        logging.warning(f"Не удалось прочитать размеры {file_path}: {e}")
+        return 0, 0
+
+def resolve_file_record(file_path, size, mtime_ns, sidecar_mtime_ns):
+    """Разобрать метаданные файла: timestamp, источник, текст и размеры.
+
+    Заголовок файла (размеры и EXIF) читается один раз, без декодирования пикселей.
+    """
+    header = read_image_header(file_path)
+    timestamp, source = get_file_timestamp_with_source(file_path, header)
+    width, height = get_image_dimensions(file_path, header)
+    return FileRecord(
+        path=file_path,
+        size=size,
+        mtime_ns=mtime_ns,
+        sidecar_mtime_ns=sidecar_mtime_ns,
+        timestamp=timestamp,
+        source=source,
+        text=get_overlay_text(file_path, header.timestamp),
+        text_format=TEXT_DATE_FORMAT,
+        width=width,
+        height=height
+    )
+
 def add_text_to_image(image, text, font_type=FONT_TYPE, font_size=FONT_SIZE,
                       text_position=TEXT_POSITION, text_color=TEXT_COLOR,
                       stroke_color=TEXT_STROKE_COLOR, stroke_width=TEXT_STROKE_WIDTH):
-    """Добавить текст на изображение с помощью Pillow."""
-    try:
-        # Конвертация в PIL Image
-        pil_image = Image.fromarray(image)
-        draw = ImageDraw.Draw(pil_image)
+    """Добавить текст на изображение (на месте).
 
-        # Загрузка шрифта
-        try:
-            font = ImageFont.truetype(font_type, font_size)
-        except Exception as e:
-            logging.warning(f"Шрифт {font_type} недоступен, используется стандартный: {e}")
-            font = ImageFont.load_default()
+    Шрифт загружается один раз, текст с обводкой рендерится в спрайт из
+    LRU-кэша и смешивается только с областью под ним.
+    """
+    try:
+        if not image.flags.writeable:
+            image = image.copy()
+        return draw_text_overlay(image, text, font_type, font_size, text_position,
+                                 text_color, stroke_color, stroke_width)
+    except Exception as e:
+        logging.error(f"Ошибка добавления текста на изображение: {e}")
+        return image
 
-        # Расчёт размеров текста с помощью textbbox
-        bbox = draw.textbbox((0, 0), text, font=font)
-        text_width = bbox[2] - bbox[0]
-        text_height = bbox[3] - bbox[1]
+# Флаги OpenCV для декодирования JPEG в 1/2, 1/4 и 1/8 размера
+_REDUCED_DECODE_FLAGS = {
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+}
 
-        # Расчёт позиции текста
-        img_width, img_height = pil_image.size
+def choose_reduction_factor(width, height, target_resolution=TARGET_RESOLUTION):
+    """Выбрать наибольшее уменьшение (8, 4, 2 или 1), после которого изображение
+    всё ещё не меньше своего размера в целевом разрешении."""
+    if not width or not height:
+        return 1
+    target_width, target_height = target_resolution
+    # Ориентация EXIF может поменять ширину и высоту местами: берём худший случай
+    scale = max(min(target_width / width, target_height / height),
+                min(target_width / height, target_height / width))
+    for factor in (8, 4, 2):
+        if factor * scale <= 1:
+            return factor
+    return 1
 
-        if text_position[0] == "center":
-            x = (img_width - text_width) // 2
-        elif text_position[0] == "right":
-            x = img_width - text_width
-        else:
-            x = text_position[0]
+def decode_image(file_path, target_resolution=TARGET_RESOLUTION, dimensions=None, mode=DECODE_MODE,
+                 data=None):
+    """Загрузить изображение (BGR) с учётом ориентации EXIF.
 
-        if isinstance(text_position[1], str) and text_position[1].startswith("bottom-"):
-            offset = int(text_position[1].split("-")[1])
-            y = img_height - text_height - offset
-        else:
-            y = text_position[1]
+    В режиме "reduced" JPEG декодируется сразу в уменьшенном размере, если
+    это не ухудшит результат в target_resolution. dimensions — размеры
+    файла (ширина, высота), если уже известны из индекса. data — байты
+    файла, уже прочитанные упреждающим чтением (декодируются из памяти).
+    """
+    flags = cv2.IMREAD_COLOR
+    ext = os.path.splitext(file_path)[1].lower()
+    if mode == "reduced" and ext in REDUCED_DECODE_EXTENSIONS:
+        width, height = dimensions or get_image_dimensions(file_path)
+        factor = choose_reduction_factor(width, height, target_resolution)
+        if factor > 1:
+            flags = _REDUCED_DECODE_FLAGS[factor]
+    if data is not None:
+        return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flags)
+    return cv2.imread(file_path, flags)
 
-        # Рисование текста с обводкой
-        for offset_x in range(-stroke_width, stroke_width + 1):
-            for offset_y in range(-stroke_width, stroke_width + 1):
-                if offset_x != 0 or offset_y != 0:
-                    draw.text((x + offset_x, y + offset_y), text, font=font, fill=stroke_color)
-        draw.text((x, y), text, font=font, fill=text_color)
-
-        # Конвертация обратно в numpy массив
-        return np.array(pil_image)
-    except Exception as e:
-        logging.error(f"Ошибка добавления текста на изображение: {e}")
-        return image
+def fit_size(width, height, max_width=1920, max_height=1080):
+    """Размер изображения в кадре: уменьшение с сохранением пропорций, без увеличения."""
+    if width > max_width or height > max_height:
+        scale = min(max_width / width, max_height / height)
+        return max(1, int(width * scale)), max(1, int(height * scale))
+    return width, height
 
 def resize_to_fullhd(image, max_width=1920, max_height=1080):
     """Масштабировать изображение до FullHD."""
     if image is None:
         return None
     h, w = image.shape[:2]
-    if w > max_width or h > max_height:
-        scale = min(max_width / w, max_height / h)
-        new_w, new_h = int(w * scale), int(h * scale)
+    new_w, new_h = fit_size(w, h, max_width, max_height)
+    if (new_w, new_h) != (w, h):
         return cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_AREA)
     return image
 
+def get_encoding_settings(photo_duration=PHOTO_DURATION):
+    """Параметры кодирования выбранного профиля ENCODING_PROFILE."""
+    return get_profile_settings(ENCODING_PROFILE, photo_duration, FPS, BITRATE)
+
+def new_canvas(target_resolution=TARGET_RESOLUTION):
+    """Новый кадр (H, W, 3, uint8) точного целевого размера."""
+    width, height = target_resolution
+    return np.empty((height, width, 3), dtype=np.uint8)
+
+def letterbox_into(image, canvas, color_conversion=None):
+    """Вписать изображение по центру canvas с чёрными полями, без промежуточных массивов.
+
+    Изображение масштабируется сразу в центральную область кадра, цвет
+    конвертируется на месте (color_conversion — код cv2.cvtColor), заливаются
+    только поля. Возвращает область кадра с изображением (view canvas).
+    """
+    height, width = canvas.shape[:2]
+    h, w = image.shape[:2]
+    new_w, new_h = fit_size(w, h, width, height)
+    x = (width - new_w) // 2
+    y = (height - new_h) // 2
+    region = canvas[y:y + new_h, x:x + new_w]
+    if (new_w, new_h) != (w, h):
+        cv2.resize(image, (new_w, new_h), dst=region, interpolation=cv2.INTER_AREA)
+        if color_conversion is not None:
+            cv2.cvtColor(region, color_conversion, dst=region)
+    elif color_conversion is not None:
+        cv2.cvtColor(image, color_conversion, dst=region)
+    else:
+        region[...] = image
+    canvas[:y] = 0
+    canvas[y + new_h:] = 0
+    canvas[y:y + new_h, :x] = 0
+    canvas[y:y + new_h, x + new_w:] = 0
+    return region
+
 def log_memory_usage():
     """Логировать использование памяти."""
-    process = psutil.Process()
-    mem_info = process.memory_info()
-    logging.info(f"Использование памяти: {mem_info.rss / 1024 / 1024:.2f} MiB")
+    rss_mb = METRICS.sample_memory(force=True)
+    logging.info(f"Использование памяти: {rss_mb:.2f} MiB")
+
+def stat_image_file(file_path, sidecar_exists):
+    """Получить размер и mtime файла и его JSON (-1, если JSON нет)."""
+    st = os.stat(file_path)
+    sidecar_mtime_ns = -1
+    if sidecar_exists:
+        try:
+            sidecar_mtime_ns = os.stat(f"{file_path}.json").st_mtime_ns
+        except OSError:
+            pass
+    return st.st_size, st.st_mtime_ns, sidecar_mtime_ns
+
+def _list_directory(dir_path):
+    """Прочитать каталог: (файлы, подкаталоги для обхода) в порядке os.walk."""
+    files, dirs = [], []
+    try:
+        with os.scandir(dir_path) as entries:
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if not is_dir:
+                    files.append(entry.name)
+                elif not entry.is_symlink():  # os.walk не заходит в ссылки на каталоги
+                    dirs.append(entry.path)
+    except OSError as e:
+        logging.error(f"Ошибка чтения каталога {dir_path}: {e}")
+    return files, dirs
+
+def _image_entries(dir_path, files):
+    """Отобрать изображения каталога: (путь, есть ли JSON)."""
+    names = set(files)
+    for file in files:
+        ext = os.path.splitext(file)[1].lower()
+        if ext in IMAGE_EXTENSIONS:
+            yield os.path.join(dir_path, file), f"{file}.json" in names
+
+def walk_image_files(root_dir, workers=SCAN_WORKERS):
+    """Найти все изображения: (путь, есть ли JSON) в порядке os.walk.
+
+    При workers > 1 каталоги одного уровня читаются параллельно, а результат
+    собирается в том же порядке, что и при последовательном обходе.
+    """
+    if workers <= 1:
+        for root, _, files in os.walk(root_dir):
+            yield from _image_entries(root, files)
+        return
+
+    listings = {}
+    level = [root_dir]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while level:
+            next_level = []
+            for dir_path, (files, dirs) in zip(level, executor.map(_list_directory, level)):
+                listings[dir_path] = (files, dirs)
+                next_level.extend(dirs)
+            level = next_level
+
+    # Обход в прямом порядке, как у os.walk(topdown=True)
+    stack = [root_dir]
+    while stack:
+        dir_path = stack.pop()
+        files, dirs = listings.pop(dir_path)
+        yield from _image_entries(dir_path, files)
+        stack.extend(reversed(dirs))
+
+def _scan_image_file(task):
+    """Получить запись файла: из индекса, если она актуальна, иначе разобрать заново."""
+    file_path, sidecar_exists, record = task
+    try:
+        size, mtime_ns, sidecar_mtime_ns = stat_image_file(file_path, sidecar_exists)
+    except OSError as e:
+        logging.error(f"Ошибка stat {file_path}: {e}")
+        return None, False
+    if is_record_fresh(record, size, mtime_ns, sidecar_mtime_ns, TEXT_DATE_FORMAT):
+        return record, False
+    return resolve_file_record(file_path, size, mtime_ns, sidecar_mtime_ns), True
+
+def _open_scan_executor(workers, executor_type):
+    """Пул для разбора файлов: (функция map, пул или None)."""
+    if workers <= 1:
+        return map, None
+    if executor_type == "process":
+        executor = ProcessPoolExecutor(max_workers=workers)
+        return partial(executor.map, chunksize=SCAN_CHUNK_SIZE), executor
+    executor = ThreadPoolExecutor(max_workers=workers)
+    return executor.map, executor
+
+def collect_image_records(root_dir, use_index=USE_METADATA_INDEX, index_path=METADATA_INDEX_PATH,
+                          workers=SCAN_WORKERS, executor_type=SCAN_EXECUTOR, streaming=STREAMING_ORDER):
+    """Собрать записи метаданных всех изображений в хронологическом порядке.
+
+    С индексом повторные запуски только вызывают stat для файлов и разбирают
+    заново лишь новые или изменённые. При workers > 1 обход каталогов и разбор
+    файлов выполняются в пуле; порядок результата тот же, что и без него.
+    При streaming записи не держатся в памяти: возвращается IndexedRecords,
+    читающий их из индекса (его нужно закрыть после использования).
+    """
+    with METRICS.timer("scan"):
+        if streaming:
+            records, sources = _collect_image_records_streaming(root_dir, index_path, workers, executor_type)
+        else:
+            records, sources = _collect_image_records(root_dir, use_index, index_path, workers, executor_type)
+    for source, count in sources.items():
+        METRICS.count(f"timestamp_source_{source}", count)
+    METRICS.count("photos_found", len(records))
+    logging.info(f"Найдено {len(records)} изображений, источники timestamp: "
+                 f"{', '.join(f'{source} {count}' for source, count in sorted(sources.items())) or '-'}")
+    # Логирование первых 10 файлов
+    for i, record in enumerate(records[:10]):
+        logging.info(f"Файл {i+1}: {record.path}, время: {datetime.fromtimestamp(record.timestamp)}")
+    if len(records) > 10:
+        logging.info(f"... и ещё {len(records) - 10} файлов")
+    return records
+
+def _collect_image_records(root_dir, use_index, index_path, workers, executor_type):
+    """Сканирование в память: (список записей, число записей по источникам timestamp)."""
+    conn = open_index(index_path) if use_index else None
+    known = load_records(conn, root_dir) if conn else {}
+    records = []
+    updated = []
+    sources = {}
+    try:
+        tasks = [(file_path, sidecar_exists, known.get(file_path))
+                 for file_path, sidecar_exists in walk_image_files(root_dir, workers)]
+        map_tasks, executor = _open_scan_executor(workers, executor_type)
+        try:
+            for record, is_updated in map_tasks(_scan_image_file, tasks):
+                if record is None:
+                    continue
+                if is_updated:
+                    updated.append(record)
+                records.append(record)
+                sources[record.source] = sources.get(record.source, 0) + 1
+        finally:
+            if executor:
+                executor.shutdown()
+
+        if conn:
+            save_records(conn, updated)
+            delete_missing_records(conn, known, {r.path for r in records})
+            logging.info(f"Индекс метаданных: из кэша {len(records) - len(updated)}, разобрано заново {len(updated)}")
+    finally:
+        if conn:
+            conn.close()
+
+    # Сортировка по timestamp
+    records.sort(key=lambda r: r.timestamp)
+    return records, sources
+
+def _collect_image_records_streaming(root_dir, index_path, workers, executor_type):
+    """Потоковое сканирование: (IndexedRecords, число записей по источникам timestamp).
+
+    Файлы обходятся порциями по STREAM_CHUNK_SIZE: для порции из индекса
+    читаются только её записи, новые сохраняются сразу, а порядок обхода
+    пишется во временную таблицу. Сортировку выполняет SQLite на диске.
+    """
+    conn = open_index(index_path)
+    sources = {}
+    found = 0
+    updated_count = 0
+    map_tasks, executor = _open_scan_executor(workers, executor_type)
+    try:
+        begin_scan_order(conn)
+        # Последовательный os.walk: параллельный обход держал бы в памяти списки всех каталогов
+        entries = walk_image_files(root_dir, workers=1)
+        while True:
+            chunk = list(islice(entries, STREAM_CHUNK_SIZE))
+            if not chunk:
+                break
+            known = load_records_for_paths(conn, [file_path for file_path, _ in chunk])
+            tasks = [(file_path, sidecar_exists, known.get(file_path)) for file_path, sidecar_exists in chunk]
+            scanned = []
+            updated = []
+            for record, is_updated in map_tasks(_scan_image_file, tasks):
+                if record is None:
+                    continue
+                if is_updated:
+                    updated.append(record)
+                scanned.append(record.path)
+                sources[record.source] = sources.get(record.source, 0) + 1
+            add_scan_order(conn, scanned)
+            save_records(conn, updated)
+            found += len(scanned)
+            updated_count += len(updated)
+            METRICS.sample_memory()
+        delete_unscanned_records(conn, root_dir)
+        logging.info(f"Индекс метаданных: из кэша {found - updated_count}, разобрано заново {updated_count}")
+        return IndexedRecords(conn), sources
+    except Exception:
+        conn.close()
+        raise
+    finally:
+        if executor:
+            executor.shutdown()
 
 def collect_image_files(root_dir):
     """Собрать все изображения в хронологическом порядке."""
-    image_files = []
-    for root, _, files in os.walk(root_dir):
-        for file in files:
-            ext = os.path.splitext(file)[1].lower()
-            if ext in IMAGE_EXTENSIONS:
-                file_path = os.path.join(root, file)
-                timestamp = get_file_timestamp(file_path)
-                image_files.append((file_path, timestamp))
+    return [record.path for record in collect_image_records(root_dir)]
 
-    # Сортировка по timestamp
-    image_files.sort(key=lambda x: x[1])
-    logging.info(f"Найдено {len(image_files)} изображений")
-    # Логирование первых 10 файлов
-    for i, (file_path, timestamp) in enumerate(image_files[:10]):
-        logging.info(f"Файл {i+1}: {file_path}, время: {datetime.fromtimestamp(timestamp)}")
-    if len(image_files) > 10:
-        logging.info(f"... и ещё {len(image_files) - 10} файлов")
-    return [f[0] for f in image_files]
+_frame_cache = None
+_frame_cache_lock = threading.Lock()
+
+def get_frame_cache():
+    """Кэш кадров процесса (None, если FRAME_CACHE выключен)."""
+    global _frame_cache
+    if not FRAME_CACHE:
+        return None
+    with _frame_cache_lock:
+        if _frame_cache is None:
+            _frame_cache = FrameCache(FRAME_CACHE_DIR, FRAME_CACHE_MAX_MB, FRAME_CACHE_STORAGE)
+    return _frame_cache
+
+def get_pixel_settings(target_resolution=TARGET_RESOLUTION):
+    """Настройки, от которых зависят пиксели кадра (для ключа кэша кадров)."""
+    return {
+        "target_resolution": list(target_resolution),
+        "decode_mode": DECODE_MODE,
+        "font": [FONT_TYPE, FONT_SIZE],
+        "text": [TEXT_DATE_FORMAT, TEXT_POSITION, TEXT_COLOR, TEXT_STROKE_COLOR, TEXT_STROKE_WIDTH],
+    }
+
+def get_frame_cache_key(file_path, record, text, target_resolution=TARGET_RESOLUTION):
+    """Ключ кадра в кэше: по записи индекса или по stat файла."""
+    if record:
+        size, mtime_ns = record.size, record.mtime_ns
+    else:
+        stat = os.stat(file_path)
+        size, mtime_ns = stat.st_size, stat.st_mtime_ns
+    return frame_cache_key(file_path, size, mtime_ns, text, get_pixel_settings(target_resolution))
+
+def prepare_frame(file_path, target_resolution=TARGET_RESOLUTION, metadata=None, canvas=None, data=None):
+    """Подготовить кадр точного целевого размера: загрузка, масштабирование и текст.
+
+    Возвращает (RGB-кадр, timestamp, текст) или None, если файл не читается.
+    Изображение масштабируется сразу в canvas (кадр из CanvasPool) по центру,
+    с чёрными полями; без canvas выделяется новый кадр. metadata — словарь {path: FileRecord} из индекса; если запись есть,
+    timestamp и текст берутся из неё без повторного чтения файлов. С
+    FRAME_CACHE готовый кадр берётся из кэша, если файл, текст и настройки
+    пикселей не менялись. data — байты файла из упреждающего чтения.
+    """
+    record = metadata.get(file_path) if metadata else None
+    dimensions = (record.width, record.height) if record else None
+    timestamp = record.timestamp if record else get_file_timestamp(file_path)
+    text = record.text if record else get_overlay_text(file_path)
+
+    cache = get_frame_cache()
+    cache_key = None
+    if cache:
+        cache_key = get_frame_cache_key(file_path, record, text, target_resolution)
+        with METRICS.timer("frame_cache"):
+            img = cache.get(cache_key)
+        if img is not None:
+            METRICS.count("frame_cache_hits")
+            if canvas is None:
+                canvas = new_canvas(target_resolution)
+            with METRICS.timer("resize"):
+                letterbox_into(img, canvas)
+            return canvas, timestamp, text
+        METRICS.count("frame_cache_misses")
+
+    with METRICS.timer("decode"):
+        img = decode_image(file_path, target_resolution, dimensions, data=data)
+    if img is None:
+        logging.warning(f"Не удалось загрузить изображение: {file_path}")
+        return None
+    if canvas is None:
+        canvas = new_canvas(target_resolution)
+    with METRICS.timer("resize"):
+        region = letterbox_into(img, canvas, cv2.COLOR_BGR2RGB)
+
+    # Текст накладывается на изображение, а не на поля кадра
+    with METRICS.timer("overlay"):
+        add_text_to_image(region, text, FONT_TYPE, FONT_SIZE, TEXT_POSITION, TEXT_COLOR,
+                          TEXT_STROKE_COLOR, TEXT_STROKE_WIDTH)
+    if cache_key:
+        with METRICS.timer("frame_cache"):
+            cache.put(cache_key, region)
+    return canvas, timestamp, text
+
+def build_output_path(output_dir, part_number, first_timestamp, last_timestamp, num_photos):
+    """Сформировать путь части по шаблону OUTPUT_FILENAME_TEMPLATE."""
+    try:
+        first_date = datetime.fromtimestamp(first_timestamp).strftime("%Y-%m-%d") if first_timestamp else "unknown"
+        last_date = datetime.fromtimestamp(last_timestamp).strftime("%Y-%m-%d") if last_timestamp else "unknown"
+        output_filename = OUTPUT_FILENAME_TEMPLATE.format(
+            first_date=first_date,
+            last_date=last_date,
+            num_photos=num_photos,
+            part_number=part_number
+        )
+    except Exception as e:
+        logging.error(f"Ошибка формирования имени файла: {e}")
+        output_filename = f"output_video_{part_number:03d}.mp4"
+    return os.path.join(output_dir, output_filename)
 
 def create_video_part(image_files, part_number, output_dir, photo_duration=2.0,
-                      target_resolution=(1920, 1080), batch_size=10):
-    """Создать одну часть видео из изображений."""
-    clips = []  # Текущий батч клипов
-    batch_clips = []  # Все батчи для части
+                      target_resolution=(1920, 1080), batch_size=10, metadata=None,
+                      engine=RENDER_ENGINE, rendered=None):
+    """Создать одну часть видео из изображений.
+
+    Возвращает (путь к части или None, оставшиеся файлы). В словарь
+    rendered записывается, что фактически попало в часть: photos,
+    first_timestamp и last_timestamp.
+    """
+    if engine == "moviepy":
+        return create_video_part_moviepy(image_files, part_number, output_dir, photo_duration,
+                                         target_resolution, batch_size, metadata, rendered)
+    return create_video_part_ffmpeg(image_files, part_number, output_dir, photo_duration,
+                                    target_resolution, metadata, rendered)
+
+def open_read_ahead(image_files, target_resolution, metadata):
+    """Упреждающее чтение изображений части (пустой контекст, если READ_AHEAD_MB = 0).
+
+    Файлы, кадры которых уже есть в кэше кадров, не читаются.
+    """
+    if not READ_AHEAD_MB:
+        return nullcontext()
+    items = []
+    for file_path in image_files:
+        if os.path.splitext(file_path)[1].lower() not in IMAGE_EXTENSIONS:
+            continue
+        record = metadata.get(file_path) if metadata else None
+        items.append((file_path, record.size if record else None))
+
+    cache = get_frame_cache()
+    skip = None
+    if cache:
+        def skip(file_path):
+            record = metadata.get(file_path) if metadata else None
+            text = record.text if record else get_overlay_text(file_path)
+            return cache.contains(get_frame_cache_key(file_path, record, text, target_resolution))
+    return ReadAhead(items, READ_AHEAD_MB * 1024 * 1024, READ_AHEAD_WORKERS, skip)
+
+def _prepare_candidate(file_path, target_resolution, metadata, pool, read_ahead=None):
+    """Подготовить кадр для ffmpeg в кадре из pool (None — пропустить файл).
+
+    После записи кадр нужно вернуть в pool. Байты файла берутся из
+    read_ahead, если он передан.
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext not in IMAGE_EXTENSIONS:
+        return None
+    data = None
+    if read_ahead:
+        # Каждый файл из упреждающего чтения нужно забрать, даже если кадр потом не получится
+        with METRICS.timer("read_wait"):
+            data = read_ahead.take(file_path)
+    canvas = pool.acquire()
+    try:
+        prepared = prepare_frame(file_path, target_resolution, metadata, canvas, data)
+    except Exception:
+        pool.release(canvas)
+        raise
+    if prepared is None:
+        pool.release(canvas)
+    return prepared
+
+def create_video_part_ffmpeg(image_files, part_number, output_dir, photo_duration=2.0,
+                             target_resolution=(1920, 1080), metadata=None, rendered=None):
+    """Создать часть видео, передавая кадры в один процесс ffmpeg.
+
+    Каждый кадр кодируется один раз, без временных PNG и батчей. Кадры
+    готовятся параллельно в FRAME_WORKERS потоках и передаются кодировщику
+    в хронологическом порядке; файлы читаются заранее в пределах READ_AHEAD_MB. Часть пишется во временный файл и
+    переименовывается после успешной записи.
+    """
+    temp_output = os.path.join(output_dir, f"temp_part_{part_number:03d}.mp4")
+    encoding = get_encoding_settings(photo_duration)
     clip_count = 0
+    consumed = 0
+    first_timestamp = None
+    last_timestamp = None
+
+    # Кадров в работе не больше, чем в очереди iter_ordered, плюс один у кодировщика
+    pool = CanvasPool(target_resolution, max(FRAME_WORKERS, MAX_FRAMES_IN_FLIGHT) + 1)
+    progress = PartProgress(part_number, min(len(image_files), MAX_CLIPS_PER_PART), METRICS)
+    try:
+        with FFmpegFrameWriter(temp_output, target_resolution, encoding["stream_fps"], codec="libx264",
+                               preset=encoding["preset"], bitrate=encoding["bitrate"],
+                               ffmpeg_params=encoding["params"], threads=ENCODER_THREADS) as writer, \
+                open_read_ahead(image_files, target_resolution, metadata) as read_ahead, \
+                closing(iter_ordered(partial(_prepare_candidate, target_resolution=target_resolution,
+                                             metadata=metadata, pool=pool, read_ahead=read_ahead),
+                                     image_files, FRAME_WORKERS, MAX_FRAMES_IN_FLIGHT)) as frames:
+            for file_path, future in frames:
+                if clip_count >= MAX_CLIPS_PER_PART:
+                    logging.info(f"Достигнут лимит клипов ({MAX_CLIPS_PER_PART}) для части {part_number}")
+                    break
+                consumed += 1
+
+                try:
+                    # Ожидание кадра: кодировщик опережает подготовку
+                    with METRICS.timer("frame_wait"):
+                        prepared = future.result()
+                except Exception as e:
+                    logging.error(f"Ошибка при обработке файла {file_path}: {e}")
+                    METRICS.count("photos_failed")
+                    continue
+                if prepared is None:
+                    METRICS.count("photos_skipped")
+                    continue
+                frame, timestamp, text = prepared
+
+                with METRICS.timer("encode"):
+                    writer.write_frame(frame, repeat=encoding["frames_per_photo"])
+                pool.release(frame)
+                if first_timestamp is None:
+                    first_timestamp = timestamp
+                last_timestamp = timestamp
+                clip_count += 1
+                METRICS.count("photos_rendered")
+                logging.debug(f"Добавлено изображение {clip_count}: {file_path} с текстом: {text}")
+                progress.advance()
+            # Дожидаемся окончания кодирования внутри замера
+            with METRICS.timer("encode"):
+                writer.close()
+    except Exception as e:
+        logging.error(f"Ошибка при создании части {part_number}: {e}")
+        return None, image_files
+
+    if clip_count == 0:
+        logging.error(f"Нет подходящих изображений для части {part_number}.")
+        if os.path.exists(temp_output):
+            os.remove(temp_output)
+        return None, image_files
+
+    output_path = build_output_path(output_dir, part_number, first_timestamp, last_timestamp, clip_count)
+    os.replace(temp_output, output_path)
+    logging.info(f"Часть {part_number} сохранена: {output_path}")
+    if rendered is not None:
+        rendered.update(photos=clip_count, first_timestamp=first_timestamp, last_timestamp=last_timestamp)
+
+    file_size_mb = os.path.getsize(output_path) / (1024 * 1024)
+    summary = progress.summary()
+    logging.info(f"Размер части {part_number}: {file_size_mb:.2f} MiB, {clip_count} фото за "
+                 f"{format_duration(summary['seconds'])} ({summary['photos_per_second']} фото/с)")
+    return output_path, image_files[consumed:]
+
+def create_video_part_moviepy(image_files, part_number, output_dir, photo_duration=2.0,
+                              target_resolution=(1920, 1080), batch_size=10, metadata=None, rendered=None):
+    """Создать часть видео через moviepy: временные PNG, батчи и финальная сборка.
+
+    Кадры приводятся к target_resolution, поэтому клипы склеиваются без
+    композиции, а батчи — без перекодирования. Кадр и буфер BGR для PNG
+    выделяются один раз на часть. Число фото и даты части считаются только
+    по закодированным батчам.
+    """
+    encoding = get_encoding_settings(photo_duration)
+    clips = []  # Текущий батч клипов
+    batch_timestamps = []  # Timestamp каждого клипа текущего батча
+    batch_paths = []  # Все батчи для части
+    clip_count = 0  # Клипов подготовлено (для лимита MAX_CLIPS_PER_PART)
+    encoded_count = 0  # Клипов в закодированных батчах
+    consumed = 0
     temp_image_dir = os.path.join(output_dir, "temp_images")
     os.makedirs(temp_image_dir, exist_ok=True)
     first_timestamp = None
     last_timestamp = None
+    progress = PartProgress(part_number, min(len(image_files), MAX_CLIPS_PER_PART), METRICS)
+    canvas = new_canvas(target_resolution)
+    bgr_frame = new_canvas(target_resolution)
+
+    def flush_batch():
+        """Закодировать текущий батч во временный файл и освободить его клипы."""
+        nonlocal clips, batch_timestamps, encoded_count, first_timestamp, last_timestamp
+        temp_output = os.path.join(output_dir, f"temp_batch_{part_number:03d}_{clip_count:03d}.mp4")
+        try:
+            batch_clip = concatenate_videoclips(clips, method="chain")
+            with METRICS.timer("encode"):
+                batch_clip.write_videofile(temp_output, **moviepy_encoder_kwargs(encoding))
+            batch_clip.close()
+            if not os.path.exists(temp_output):
+                logging.error(f"Временный батч {temp_output} не создан")
+                return
+            batch_paths.append(temp_output)
+            encoded_count += len(clips)
+            if first_timestamp is None:
+                first_timestamp = batch_timestamps[0]
+            last_timestamp = batch_timestamps[-1]
+            METRICS.count("photos_rendered", len(clips))
+            logging.debug(f"Сохранён временный батч: {temp_output} (изображений: {len(clips)})")
+        except Exception as e:
+            logging.error(f"Ошибка при создании батча {temp_output}: {e}")
+            METRICS.count("photos_failed", len(clips))
+        finally:
+            for clip in clips:
+                clip.close()
+            clips = []
+            batch_timestamps = []
+            # Удаление временных изображений
+            with METRICS.timer("temp_io"):
+                for temp_img in glob.glob(os.path.join(temp_image_dir, f"temp_{part_number:03d}_*.png")):
+                    try:
+                        os.remove(temp_img)
+                    except Exception as e:
+                        logging.error(f"Ошибка удаления {temp_img}: {e}")
+            gc.collect()
+            METRICS.sample_memory()
 
     for i, file_path in enumerate(image_files):
         if clip_count >= MAX_CLIPS_PER_PART:
             logging.info(f"Достигнут лимит клипов ({MAX_CLIPS_PER_PART}) для части {part_number}")
             break
+        consumed = i + 1
 
         ext = os.path.splitext(file_path)[1].lower()
         if ext not in IMAGE_EXTENSIONS:
             continue
 
         try:
-            # Обработка изображения
-            img = cv2.imread(file_path)
-            if img is None:
-                logging.warning(f"Не удалось загрузить изображение: {file_path}")
-                continue
-            img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            img = resize_to_fullhd(img, max_width=target_resolution[0], max_height=target_resolution[1])
-            if img is None:
-                logging.warning(f"Некорректное изображение после масштабирования: {file_path}")
+            prepared = prepare_frame(file_path, target_resolution, metadata, canvas)
+            if prepared is None:
+                METRICS.count("photos_skipped")
                 continue
-
-            # Обновление временных меток
-            timestamp = get_file_timestamp(file_path)
-            if first_timestamp is None:
-                first_timestamp = timestamp
-            last_timestamp = timestamp
-
-            # Добавление текста
-            text = get_json_text_data(file_path)
-            if not text:
-                text = get_text_timestamp_from_filename(file_path)
-            img_with_text = add_text_to_image(img, text)
+            frame, timestamp, text = prepared
 
             # Сохранение временного изображения
             temp_image_path = os.path.join(temp_image_dir, f"temp_{part_number:03d}_{clip_count:03d}.png")
-            cv2.imwrite(temp_image_path, cv2.cvtColor(img_with_text, cv2.COLOR_RGB2BGR))
+            with METRICS.timer("temp_io"):
+                cv2.cvtColor(frame, cv2.COLOR_RGB2BGR, dst=bgr_frame)
+                cv2.imwrite(temp_image_path, bgr_frame)
             if not os.path.exists(temp_image_path):
                 logging.error(f"Временное изображение {temp_image_path} не создано")
                 continue
@@ -296,95 +913,57 @@ def create_video_part(image_files, part_number, output_dir, photo_duration=2.0,
             # Создание клипа
             clip = ImageClip(temp_image_path, duration=photo_duration)
             clips.append(clip)
+            batch_timestamps.append(timestamp)
             clip_count += 1
-            logging.info(f"Добавлено изображение {clip_count}: {file_path} с текстом: {text}")
-
-            # Логирование памяти
-            log_memory_usage()
-
-            # Обработка батча
-            if len(clips) >= batch_size or i == len(image_files) - 1 or clip_count >= MAX_CLIPS_PER_PART:
-                if clips:
-                    try:
-                        batch_clip = concatenate_videoclips(clips, method="compose")
-                        temp_output = os.path.join(output_dir, f"temp_batch_{part_number:03d}_{clip_count:03d}.mp4")
-                        batch_clip.write_videofile(
-                            temp_output,
-                            codec="libx264",
-                            fps=FPS,
-                            audio=False,
-                            ffmpeg_params=["-an", "-b:v", BITRATE],
-                            preset="medium"
-                        )
-                        batch_clip.close()
-                        if not os.path.exists(temp_output):
-                            logging.error(f"Временный батч {temp_output} не создан")
-                            clips = []
-                            continue
-                        batch_clips.append(VideoFileClip(temp_output))
-                        logging.info(f"Сохранён временный батч: {temp_output} (изображений: {len(clips)})")
-                    except Exception as e:
-                        logging.error(f"Ошибка при создании батча {temp_output}: {e}")
-                        continue
-                    finally:
-                        for clip in clips:
-                            clip.close()
-                        clips = []
-                        # Удаление временных изображений
-                        for temp_img in glob.glob(os.path.join(temp_image_dir, f"temp_{part_number:03d}_*.png")):
-                            try:
-                                os.remove(temp_img)
-                            except Exception as e:
-                                logging.error(f"Ошибка удаления {temp_img}: {e}")
-                        gc.collect()
-                        log_memory_usage()
-
+            logging.debug(f"Добавлено изображение {clip_count}: {file_path} с текстом: {text}")
+            progress.advance()
         except Exception as e:
             logging.error(f"Ошибка при обработке файла {file_path}: {e}")
+            METRICS.count("photos_failed")
             continue
 
-    if not batch_clips:
+        if len(clips) >= batch_size or clip_count >= MAX_CLIPS_PER_PART:
+            flush_batch()
+
+    # Последний неполный батч (в т.ч. если последние файлы части не прочитались)
+    if clips:
+        flush_batch()
+
+    if not batch_paths:
         logging.error(f"Нет подходящих батчей для части {part_number}.")
         shutil.rmtree(temp_image_dir, ignore_errors=True)
         return None, image_files
 
-    # Формирование имени файла
-    try:
-        first_date = datetime.fromtimestamp(first_timestamp).strftime("%Y-%m-%d") if first_timestamp else "unknown"
-        last_date = datetime.fromtimestamp(last_timestamp).strftime("%Y-%m-%d") if last_timestamp else "unknown"
-        num_photos = clip_count
-        output_filename = OUTPUT_FILENAME_TEMPLATE.format(
-            first_date=first_date,
-            last_date=last_date,
-            num_photos=num_photos,
-            part_number=part_number
-        )
-        output_path = os.path.join(output_dir, output_filename)
-    except Exception as e:
-        logging.error(f"Ошибка формирования имени файла: {e}")
-        output_filename = f"output_video_{part_number:03d}.mp4"
-        output_path = os.path.join(output_dir, output_filename)
+    output_path = build_output_path(output_dir, part_number, first_timestamp, last_timestamp, encoded_count)
 
     # Финальная сборка
+    batch_clips = []
     try:
-        logging.info(f"Сборка финального видео для части {part_number} ({clip_count} клипов)")
-        final_clip = concatenate_videoclips(batch_clips, method="compose")
-        final_clip.write_videofile(
-            output_path,
-            codec="libx264",
-            fps=FPS,
-            audio=False,
-            ffmpeg_params=["-an", "-b:v", BITRATE],
-            preset="medium"
-        )
-        final_clip.close()
+        logging.info(f"Сборка финального видео для части {part_number} ({encoded_count} клипов)")
+        temp_output = os.path.join(output_dir, f"temp_part_{part_number:03d}.mp4")
+        compatible, reason = check_stream_copy_compatible(batch_paths)
+        if compatible:
+            with METRICS.timer("concat"):
+                concat_stream_copy(batch_paths, temp_output)
+        else:
+            logging.warning(f"Батчи части {part_number} различаются, требуется перекодирование: {reason}")
+            batch_clips = [VideoFileClip(path) for path in batch_paths]
+            final_clip = concatenate_videoclips(batch_clips, method="chain")
+            with METRICS.timer("concat"):
+                final_clip.write_videofile(temp_output, **moviepy_encoder_kwargs(encoding))
+            final_clip.close()
+        os.replace(temp_output, output_path)
         logging.info(f"Часть {part_number} сохранена: {output_path}")
+        if rendered is not None:
+            rendered.update(photos=encoded_count, first_timestamp=first_timestamp, last_timestamp=last_timestamp)
 
         file_size_mb = os.path.getsize(output_path) / (1024 * 1024)
-        logging.info(f"Размер части {part_number}: {file_size_mb:.2f} MiB")
+        summary = progress.summary()
+        logging.info(f"Размер части {part_number}: {file_size_mb:.2f} MiB, {encoded_count} фото за "
+                     f"{format_duration(summary['seconds'])} ({summary['photos_per_second']} фото/с)")
 
-        remaining_files = image_files[clip_count:] if clip_count < len(image_files) else []
-        return output_path, remaining_files
+        # Пропущенные файлы тоже считаются обработанными
+        return output_path, image_files[consumed:]
     except Exception as e:
         logging.error(f"Ошибка при создании части {part_number}: {e}")
         return None, image_files
@@ -394,48 +973,674 @@ def create_video_part(image_files, part_number, output_dir, photo_duration=2.0,
         for temp_file in glob.glob(os.path.join(output_dir, f"temp_batch_{part_number:03d}_*.mp4")):
             try:
                 os.remove(temp_file)
-                logging.info(f"Удалён временный файл: {temp_file}")
+                logging.debug(f"Удалён временный файл: {temp_file}")
             except Exception as e:
                 logging.error(f"Ошибка удаления {temp_file}: {e}")
         shutil.rmtree(temp_image_dir, ignore_errors=True)
         gc.collect()
         log_memory_usage()
 
-def main(root_dir=ROOT_DIRECTORY, output_base="output_video"):
-    """Основная функция для создания видео."""
-    if os.path.exists(RESULTS_FOLDER_PATH):
-        shutil.rmtree(RESULTS_FOLDER_PATH)
-        logging.info(f"Очищена папка: {RESULTS_FOLDER_PATH}")
-    os.makedirs(RESULTS_FOLDER_PATH, exist_ok=True)
-    logging.info(f"Создана папка: {RESULTS_FOLDER_PATH}")
+def scale_text_position(text_position, scale):
+    """Масштабировать отступы TEXT_POSITION (числа и "bottom-N") для другого разрешения."""
+    x, y = text_position
+    if isinstance(x, (int, float)):
+        x = round(x * scale)
+    if isinstance(y, str) and y.startswith("bottom-"):
+        y = f"bottom-{round(int(y.split('-')[1]) * scale)}"
+    elif isinstance(y, (int, float)):
+        y = round(y * scale)
+    return x, y
+
+def apply_preview_settings(resolution=PREVIEW_RESOLUTION):
+    """Переключить процесс на быстрый предпросмотр.
+
+    Тот же порядок и текст, но малое разрешение (JPEG декодируются сразу
+    в 1/8), быстрый профиль кодирования и шрифт, отступы и обводка,
+    уменьшенные пропорционально высоте кадра. Кэш кадров не используется.
+    """
+    global TARGET_RESOLUTION, FONT_SIZE, TEXT_POSITION, TEXT_STROKE_WIDTH
+    global ENCODING_PROFILE, BITRATE, MAX_CLIPS_PER_PART, FRAME_CACHE
+    scale = resolution[1] / TARGET_RESOLUTION[1]
+    FONT_SIZE = max(8, round(FONT_SIZE * scale))
+    TEXT_POSITION = scale_text_position(TEXT_POSITION, scale)
+    if TEXT_STROKE_WIDTH:
+        TEXT_STROKE_WIDTH = max(1, round(TEXT_STROKE_WIDTH * scale))
+    TARGET_RESOLUTION = tuple(resolution)
+    ENCODING_PROFILE = PREVIEW_ENCODING_PROFILE
+    BITRATE = PREVIEW_BITRATE
+    MAX_CLIPS_PER_PART = PREVIEW_MAX_CLIPS_PER_PART
+    FRAME_CACHE = False
+    logging.info(f"Предпросмотр: {resolution[0]}x{resolution[1]}, профиль {ENCODING_PROFILE}, шрифт {FONT_SIZE}")
+
+def parse_date(value, end_of_day=False):
+    """Перевести дату "YYYY-MM-DD" в timestamp начала (или конца) дня."""
+    day = datetime.strptime(value, "%Y-%m-%d")
+    if end_of_day:
+        day += timedelta(days=1)
+    return day.timestamp()
+
+def sample_records(records, every=1, date_from=None, date_to=None):
+    """Выборка записей для предпросмотра: каждая every-я из диапазона дат (включительно)."""
+    start = parse_date(date_from) if date_from else None
+    end = parse_date(date_to, end_of_day=True) if date_to else None
+    sampled = []
+    position = 0
+    for record in records:
+        if (start is not None and record.timestamp < start) or (end is not None and record.timestamp >= end):
+            continue
+        if position % every == 0:
+            sampled.append(record)
+        position += 1
+    logging.info(f"Выборка: {len(sampled)} из {position} фото в диапазоне (каждое {every}-е)")
+    return sampled
+
+def deduplicate_records(records, threshold=DEDUP_THRESHOLD, time_window=DEDUP_TIME_WINDOW):
+    """Убрать дубликаты из упорядоченных записей: (оставшиеся записи, отчёт).
+
+    Хеши кэшируются в индексе метаданных. Для IndexedRecords дубликаты
+    исключаются из порядка в индексе, для списка возвращается новый список.
+    """
+    streaming = isinstance(records, IndexedRecords)
+    if streaming:
+        duplicate_sizes = records.duplicate_sizes()
+        conn = records.conn
+    else:
+        duplicate_sizes = {size for size, count in Counter(r.size for r in records).items() if count > 1}
+        conn = open_index(METADATA_INDEX_PATH) if USE_METADATA_INDEX else None
+    checked = len(records)
+    try:
+        with METRICS.timer("dedup"):
+            dropped = find_duplicates(records, duplicate_sizes, threshold, time_window, FRAME_WORKERS, conn)
+    finally:
+        if conn and not streaming:
+            conn.close()
+
+    dropped_paths = {item["path"] for item in dropped}
+    if streaming:
+        records.exclude(dropped_paths)
+    else:
+        records = [record for record in records if record.path not in dropped_paths]
+    exact = sum(1 for item in dropped if item["reason"] == "exact")
+    METRICS.count("photos_dropped_exact", exact)
+    METRICS.count("photos_dropped_similar", len(dropped) - exact)
+    logging.info(f"Дубликаты: отброшено {len(dropped)} из {checked} "
+                 f"(точных копий {exact}, похожих снимков {len(dropped) - exact})")
+    report = {
+        "threshold": threshold,
+        "time_window": time_window,
+        "photos_checked": checked,
+        "photos_kept": checked - len(dropped),
+        "dropped_exact": exact,
+        "dropped_similar": len(dropped) - exact,
+        "dropped": dropped,
+    }
+    return records, report
+
+def get_render_settings():
+    """Настройки, от которых зависит содержимое и разбиение частей."""
+    return {
+        "target_resolution": TARGET_RESOLUTION,
+        "photo_duration": PHOTO_DURATION,
+        "fps": FPS,
+        "bitrate": BITRATE,
+        "encoding_profile": ENCODING_PROFILE,
+        "render_engine": RENDER_ENGINE,
+        "max_clips_per_part": MAX_CLIPS_PER_PART,
+        "max_file_size_mb": MAX_FILE_SIZE_MB,
+        "part_split_by": PART_SPLIT_BY,
+        "output_filename_template": OUTPUT_FILENAME_TEMPLATE,
+        "font": [FONT_TYPE, FONT_SIZE],
+        "text": [TEXT_DATE_FORMAT, TEXT_POSITION, TEXT_COLOR, TEXT_STROKE_COLOR, TEXT_STROKE_WIDTH],
+    }
+
+def estimate_part_size_bytes(num_photos, photo_duration=PHOTO_DURATION, bitrate=BITRATE):
+    """Прогноз размера части: битрейт × длительность с запасом на контейнер."""
+    return parse_bitrate(bitrate) / 8 * photo_duration * num_photos * SIZE_ESTIMATE_MARGIN
+
+def get_calendar_period(timestamp, split_by):
+    """Календарный период снимка для разбиения частей ("month" или "year")."""
+    dt = datetime.fromtimestamp(timestamp)
+    if split_by == "year":
+        return dt.year
+    if split_by == "month":
+        return dt.year, dt.month
+    raise ValueError(f"Неизвестный режим разбиения по календарю: {split_by}")
+
+def _make_part(part_records, start, part_number, output_dir, bytes_per_photo):
+    """Описание части: диапазон файлов, прогноз размера и ожидаемое имя файла."""
+    end = start + len(part_records)
+    first_timestamp = part_records[0].timestamp
+    last_timestamp = part_records[-1].timestamp
+    return {
+        "part_number": part_number,
+        "start": start,
+        "end": end,
+        "files_digest": files_digest(record.path for record in part_records),
+        "content_digest": content_digest((record.path, record.size, record.mtime_ns, record.text)
+                                         for record in part_records),
+        "first_path": part_records[0].path,
+        "first_timestamp": first_timestamp,
+        "last_timestamp": last_timestamp,
+        "estimated_size_mb": round(bytes_per_photo * len(part_records) / (1024 * 1024), 1),
+        "expected_output": os.path.basename(build_output_path(
+            output_dir, part_number, first_timestamp, last_timestamp, len(part_records))),
+        "status": "pending",
+    }
+
+def get_part_limit(max_clips=MAX_CLIPS_PER_PART, max_size_mb=MAX_FILE_SIZE_MB,
+                   photo_duration=PHOTO_DURATION, bitrate=BITRATE):
+    """Прогноз байт на фото и предельное число фото в части."""
+    bytes_per_photo = estimate_part_size_bytes(1, photo_duration, bitrate)
+    limit = max_clips
+    if max_size_mb:
+        limit = min(limit, max(1, int(max_size_mb * 1024 * 1024 // bytes_per_photo)))
+    return bytes_per_photo, limit
+
+def split_records(records, limit, split_by=PART_SPLIT_BY):
+    """Разбить упорядоченные записи на группы до limit файлов в пределах периода split_by."""
+    part_records = []
+    period = None
+    for record in records:
+        record_period = get_calendar_period(record.timestamp, split_by) if split_by else None
+        if part_records and (len(part_records) >= limit or record_period != period):
+            yield part_records
+            part_records = []
+        part_records.append(record)
+        period = record_period
+    if part_records:
+        yield part_records
 
-    image_files = collect_image_files(root_dir)
-    if not image_files:
+def plan_parts(records, output_dir=RESULTS_FOLDER_PATH, max_clips=MAX_CLIPS_PER_PART,
+               max_size_mb=MAX_FILE_SIZE_MB, split_by=PART_SPLIT_BY,
+               photo_duration=PHOTO_DURATION, bitrate=BITRATE):
+    """Разбить упорядоченные записи на независимые части до начала рендера.
+
+    Часть закрывается, когда достигнут max_clips файлов, прогноз размера
+    (битрейт × длительность) превысил бы max_size_mb или начался новый
+    календарный период split_by. Результат детерминирован: список словарей
+    с диапазоном файлов [start, end), отпечатком их списка, прогнозом
+    размера и ожидаемым именем выходного файла. Записи читаются одним
+    проходом, поэтому records может быть и IndexedRecords.
+    """
+    bytes_per_photo, limit = get_part_limit(max_clips, max_size_mb, photo_duration, bitrate)
+    parts = []
+    start = 0
+    for part_records in split_records(records, limit, split_by):
+        parts.append(_make_part(part_records, start, len(parts) + 1, output_dir, bytes_per_photo))
+        start += len(part_records)
+    if parts:
+        logging.info(f"Запланировано частей: {len(parts)} (до {limit} фото, "
+                     f"~{bytes_per_photo * limit / (1024 * 1024):.0f} MiB на часть)")
+    return parts
+
+def build_manifest(root_dir, records, parts):
+    """Собрать манифест запуска: источник, настройки и план частей."""
+    return {
+        "version": MANIFEST_VERSION,
+        "root_dir": root_dir,
+        "settings_digest": settings_digest(get_render_settings()),
+        "files_digest": files_digest(record.path for record in records),
+        "parts": parts,
+    }
+
+def restore_progress(manifest, previous, part_statuses=None):
+    """Перенести статусы частей из прошлого манифеста и файлов статусов, если план тот же.
+
+    План тот же, если у каждой части совпадают и пути (files_digest), и
+    содержимое файлов с текстом наложения (content_digest).
+    """
+    if not previous:
+        return False
+    same_plan = (previous.get("root_dir") == manifest["root_dir"] and
+                 previous.get("settings_digest") == manifest["settings_digest"] and
+                 previous.get("files_digest") == manifest["files_digest"] and
+                 len(previous.get("parts", [])) == len(manifest["parts"]))
+    if not same_plan:
+        return False
+    for part, old_part in zip(manifest["parts"], previous["parts"]):
+        # Те же пути, но изменённые файлы или их текст (content_digest) — дело инкрементального плана
+        if (old_part.get("files_digest") != part["files_digest"] or
+                old_part.get("content_digest") != part["content_digest"]):
+            return False
+    for part, old_part in zip(manifest["parts"], previous["parts"]):
+        # Статусы, записанные воркерами (в т.ч. других машин), новее манифеста
+        status = (part_statuses or {}).get(part["part_number"])
+        if (status and status.get("files_digest") == part["files_digest"] and
+                status.get("content_digest") == part["content_digest"]):
+            old_part = status
+        for key in PART_RESULT_KEYS:
+            if key in old_part:
+                part[key] = old_part[key]
+    return True
+
+def _merge_part_statuses(parts, part_statuses):
+    """Части плана с учётом статусов, записанных воркерами (в т.ч. других машин)."""
+    merged = []
+    for part in parts:
+        status = (part_statuses or {}).get(part["part_number"])
+        if (status and status.get("files_digest") == part.get("files_digest") and
+                status.get("content_digest") == part.get("content_digest")):
+            part = dict(part, **{key: status[key] for key in PART_RESULT_KEYS if key in status})
+        merged.append(part)
+    return merged
+
+def plan_parts_incremental(records, root_dir, previous, part_statuses=None, output_dir=RESULTS_FOLDER_PATH,
+                           max_clips=MAX_CLIPS_PER_PART, max_size_mb=MAX_FILE_SIZE_MB,
+                           split_by=PART_SPLIT_BY, photo_duration=PHOTO_DURATION, bitrate=BITRATE):
+    """Спланировать части, сохраняя границы и готовые файлы прошлого плана.
+
+    Границы прошлых частей — их первые файлы: каждая запись попадает в
+    отрезок той прошлой части, после начала которой она стоит (если первый
+    файл части удалён — по его timestamp). Отрезок разбивается по тем же
+    правилам, что и в plan_parts; часть с теми же файлами и содержимым
+    (путь, размер, mtime, текст), что и прошлая, получает её готовый файл,
+    остальные рендерятся заново. Возвращает (части, число сохранённых) или
+    (None, 0), если прошлый план нельзя использовать (другой архив или
+    настройки, старый манифест).
+    """
+    if (not previous or previous.get("root_dir") != root_dir or
+            previous.get("settings_digest") != settings_digest(get_render_settings())):
+        return None, 0
+    old_parts = _merge_part_statuses(previous.get("parts", []), part_statuses)
+    if not old_parts or any("first_path" not in part or "content_digest" not in part for part in old_parts):
+        return None, 0
+
+    bytes_per_photo, limit = get_part_limit(max_clips, max_size_mb, photo_duration, bitrate)
+    anchors = [(part["first_path"], part["first_timestamp"]) for part in old_parts[1:]]
+    parts = []
+    reused = 0
+    start = 0
+
+    def close_segment(segment, old_part):
+        nonlocal reused, start
+        for part_records in split_records(segment, limit, split_by):
+            part = _make_part(part_records, start, len(parts) + 1, output_dir, bytes_per_photo)
+            # Без "rendered" (старый манифест) нельзя построить верное имя под новым номером —
+            # такая часть сохраняется, только если её номер не изменился
+            if (part["files_digest"] == old_part["files_digest"] and
+                    part["content_digest"] == old_part["content_digest"] and
+                    (old_part.get("rendered") or old_part["part_number"] == part["part_number"]) and
+                    is_part_complete(old_part, output_dir, verify_checksum=False)):
+                part.update((key, old_part[key]) for key in PART_RESULT_KEYS if key in old_part)
+                reused += 1
+            parts.append(part)
+            start += len(part_records)
+
+    segment = []
+    index = 0
+    for record in records:
+        while index < len(anchors) and (record.path == anchors[index][0] or record.timestamp > anchors[index][1]):
+            close_segment(segment, old_parts[index])
+            segment = []
+            index += 1
+        segment.append(record)
+    close_segment(segment, old_parts[index])
+    return parts, reused
+
+def get_rendered_output_name(part, output_dir=RESULTS_FOLDER_PATH):
+    """Имя файла готовой части по её номеру и тому, что фактически в неё попало."""
+    rendered = part["rendered"]
+    return os.path.basename(build_output_path(output_dir, part["part_number"], rendered["first_timestamp"],
+                                              rendered["last_timestamp"], rendered["photos"]))
+
+def reuse_part_files(output_dir, previous, parts):
+    """Удалить файлы прошлых частей, которые будут пересозданы, и переименовать
+    сохранённые под новые номера.
+
+    Новое имя строится из фактических дат и числа фото части (rendered), а
+    не из плана: пропущенные при рендере фото в плане остаются.
+    """
+    kept = {part["output"] for part in parts if part.get("status") == "complete"}
+    for old_part in previous.get("parts", []):
+        output = old_part.get("output")
+        if output and output not in kept and os.path.exists(os.path.join(output_dir, output)):
+            os.remove(os.path.join(output_dir, output))
+            logging.info(f"Удалена устаревшая часть: {output}")
+
+    # Через временные имена: новое имя одной части может совпадать со старым именем другой
+    renamed = [(part, get_rendered_output_name(part, output_dir)) for part in parts
+               if part.get("status") == "complete" and part.get("rendered")]
+    renamed = [(part, name) for part, name in renamed if part["output"] != name]
+    for part, _ in renamed:
+        os.replace(os.path.join(output_dir, part["output"]),
+                   os.path.join(output_dir, part["output"] + ".renaming"))
+    for part, name in renamed:
+        os.replace(os.path.join(output_dir, part["output"] + ".renaming"), os.path.join(output_dir, name))
+        logging.info(f"Часть переименована: {part['output']} -> {name}")
+        part["output"] = name
+
+def get_output_patterns():
+    """Шаблоны имён файлов, которые скрипт создаёт в папке результатов."""
+    return [re.sub(r"\{[^}]*\}", "*", OUTPUT_FILENAME_TEMPLATE), "output_video_*.mp4",
+            "temp_part_*.mp4", "temp_batch_*.mp4", "temp_images"]
+
+def remove_part_leftovers(output_dir, part_number):
+    """Удалить остатки прерванного рендера части (временные и недописанные файлы)."""
+    patterns = [f"temp_part_{part_number:03d}.mp4", f"temp_batch_{part_number:03d}_*.mp4",
+                f"*-photos_{part_number:03d}.mp4"]
+    for pattern in patterns:
+        for path in glob.glob(os.path.join(output_dir, pattern)):
+            try:
+                os.remove(path)
+                logging.info(f"Удалён незавершённый файл: {path}")
+            except Exception as e:
+                logging.error(f"Ошибка удаления {path}: {e}")
+
+def parse_shard(shard):
+    """Разобрать шард "K/N" (K от 1 до N) в (K, N)."""
+    try:
+        index, count = (int(value) for value in shard.split("/"))
+    except ValueError:
+        raise ValueError(f"Шард должен иметь вид K/N, получено: {shard}")
+    if not 1 <= index <= count:
+        raise ValueError(f"Номер шарда вне диапазона 1..{count}: {shard}")
+    return index, count
+
+def select_shard_parts(parts, shard):
+    """Отобрать части шарда K/N: каждая N-я часть, начиная с K-й."""
+    index, count = parse_shard(shard)
+    return [part for position, part in enumerate(parts) if position % count == index - 1]
+
+def render_part(part, part_records, output_dir):
+    """Отрендерить одну часть плана и вернуть её обновлённое описание."""
+    part = dict(part)
+    part_number = part["part_number"]
+    logging.info(f"Обработка части {part_number}...")
+    metrics_before = METRICS.snapshot()
+    started = time.monotonic()
+    remove_part_leftovers(output_dir, part_number)
+    rendered = {}
+    output_path, _ = create_video_part(
+        [record.path for record in part_records],
+        part_number,
+        output_dir,
+        photo_duration=PHOTO_DURATION,
+        target_resolution=TARGET_RESOLUTION,
+        batch_size=BATCH_SIZE,
+        metadata={record.path: record for record in part_records},
+        rendered=rendered
+    )
+    if output_path:
+        mark_part_complete(part, output_path, rendered)
+        logging.info(f"Завершена часть {part_number}")
+    else:
+        part["status"] = "failed"
+        logging.error(f"Не удалось создать часть {part_number}")
+    # Метрики части передаются в основной процесс и попадают в отчёт запуска, а не в манифест
+    part["metrics"] = METRICS.since(metrics_before)
+    part["metrics"]["seconds"] = round(time.monotonic() - started, 3)
+    return part
+
+def _init_render_worker(frame_workers, max_frames_in_flight, encoder_threads, read_ahead_mb):
+    """Настроить процесс рендера: его доля потоков и памяти."""
+    global FRAME_WORKERS, MAX_FRAMES_IN_FLIGHT, ENCODER_THREADS, READ_AHEAD_MB
+    FRAME_WORKERS = frame_workers
+    MAX_FRAMES_IN_FLIGHT = max_frames_in_flight
+    ENCODER_THREADS = encoder_threads
+    READ_AHEAD_MB = read_ahead_mb
+
+def get_worker_settings(max_concurrent, memory_limit_mb=WORKER_MEMORY_LIMIT_MB):
+    """Разделить ядра и память между параллельными частями."""
+    cpu_count = os.cpu_count() or 1
+    frame_workers = max(1, cpu_count // max_concurrent)
+    encoder_threads = max(1, cpu_count // max_concurrent)
+    max_frames_in_flight = 2 * frame_workers
+    # Части читают с одного диска: бюджет упреждающего чтения делится между ними
+    read_ahead_mb = READ_AHEAD_MB // max_concurrent
+    if memory_limit_mb:
+        # Не больше половины бюджета на кадры в очереди, четверть — на упреждающее чтение,
+        # остальное — на декодирование
+        frame_bytes = TARGET_RESOLUTION[0] * TARGET_RESOLUTION[1] * 3
+        max_frames_in_flight = max(1, min(max_frames_in_flight,
+                                          int(memory_limit_mb * 1024 * 1024 // 2 // frame_bytes)))
+        read_ahead_mb = min(read_ahead_mb, memory_limit_mb // 4)
+    return frame_workers, max_frames_in_flight, encoder_threads, read_ahead_mb
+
+def _has_memory_for_worker(running, memory_limit_mb):
+    """Хватает ли свободной памяти, чтобы запустить ещё одну часть."""
+    if not memory_limit_mb or running == 0:
+        return True
+    return psutil.virtual_memory().available >= memory_limit_mb * 1024 * 1024
+
+def render_parts(parts, records, output_dir, on_part_done, max_concurrent=MAX_CONCURRENT_PARTS,
+                 memory_limit_mb=WORKER_MEMORY_LIMIT_MB):
+    """Отрендерить части: последовательно или в max_concurrent процессах.
+
+    Новая часть запускается, только если свободной памяти не меньше
+    memory_limit_mb. Имена файлов задаёт план, поэтому порядок частей не
+    зависит от порядка завершения. on_part_done вызывается для каждой части
+    в основном процессе.
+    """
+    if max_concurrent <= 1 or len(parts) <= 1:
+        for part in parts:
+            on_part_done(render_part(part, records[part["start"]:part["end"]], output_dir))
+        return
+
+    worker_settings = get_worker_settings(max_concurrent, memory_limit_mb)
+    logging.info(f"Параллельный рендер: {max_concurrent} частей одновременно, "
+                 f"потоков подготовки/кодирования на часть: {worker_settings[0]}/{worker_settings[2]}")
+    queue = deque(parts)
+    running = {}
+    with ProcessPoolExecutor(max_workers=max_concurrent, initializer=_init_render_worker,
+                             initargs=worker_settings) as executor:
+        while queue or running:
+            while (queue and len(running) < max_concurrent and
+                   _has_memory_for_worker(len(running), memory_limit_mb)):
+                part = queue.popleft()
+                future = executor.submit(render_part, part, records[part["start"]:part["end"]], output_dir)
+                running[future] = part
+            done, _ = wait(running, timeout=5, return_when=FIRST_COMPLETED)
+            for future in done:
+                part = running.pop(future)
+                try:
+                    result = future.result()
+                    METRICS.merge(result.get("metrics", {}))
+                    on_part_done(result)
+                except Exception as e:
+                    logging.error(f"Ошибка процесса рендера части {part['part_number']}: {e}")
+                    on_part_done(dict(part, status="failed"))
+
+def build_run_report(started, root_dir, records, parts, part_reports, shard=None, max_concurrent=1):
+    """Отчёт запуска: время этапов, счётчики, память и скорость по частям."""
+    finished = datetime.now()
+    metrics = METRICS.snapshot()
+    wall_seconds = (finished - started).total_seconds()
+    photos_rendered = metrics["counters"].get("photos_rendered", 0)
+    return {
+        "started": started.isoformat(timespec="seconds"),
+        "finished": finished.isoformat(timespec="seconds"),
+        "wall_seconds": round(wall_seconds, 3),
+        "root_dir": root_dir,
+        "shard": shard,
+        "max_concurrent_parts": max_concurrent,
+        "settings": get_render_settings(),
+        "photos_found": len(records),
+        "parts_planned": len(parts),
+        "photos_per_second": round(photos_rendered / wall_seconds, 2) if wall_seconds > 0 else None,
+        # Время этапов подготовки кадров суммируется по всем потокам и процессам
+        "stage_seconds": metrics["timers"],
+        "counters": metrics["counters"],
+        "peak_rss_mb": metrics["peak_rss_mb"],
+        "parts": sorted(part_reports, key=lambda report: report["part_number"]),
+    }
+
+def log_run_summary(report, report_path):
+    """Вывести итог запуска одной строкой по этапам."""
+    stages = ", ".join(f"{stage} {seconds:.1f} с" for stage, seconds in report["stage_seconds"].items())
+    logging.info(f"Итого: {report['counters'].get('photos_rendered', 0)} фото за "
+                 f"{format_duration(report['wall_seconds'])} ({report['photos_per_second']} фото/с), "
+                 f"пик памяти {report['peak_rss_mb']:.0f} MiB; этапы: {stages or '-'}")
+    logging.info(f"Отчёт запуска: {report_path}")
+
+def main(root_dir=ROOT_DIRECTORY, output_base="output_video", output_dir=RESULTS_FOLDER_PATH,
+         max_concurrent=MAX_CONCURRENT_PARTS, shard=None, plan_only=False,
+         preview=False, every=1, date_from=None, date_to=None):
+    """Основная функция для создания видео.
+
+    shard — "K/N": отрендерить только свою долю частей (для запуска на
+    нескольких машинах с общей папкой результатов и одинаковым путём к
+    архиву). plan_only — только просканировать архив и сохранить план.
+    preview — быстрый предпросмотр в малом разрешении (apply_preview_settings);
+    every, date_from, date_to — выборка фото (каждое every-е в диапазоне дат),
+    только вместе с preview: план выборки заменил бы план всего архива.
+    """
+    started = datetime.now()
+    if (every > 1 or date_from or date_to) and not preview:
+        logging.error("Выборка фото (every, date_from, date_to) доступна только для предпросмотра.")
+        return
+    if preview:
+        apply_preview_settings(PREVIEW_RESOLUTION)
+        # Настройки предпросмотра изменены только в этом процессе
+        max_concurrent = 1
+        if output_dir == RESULTS_FOLDER_PATH:
+            # Иначе предпросмотр (другие настройки) очистил бы папку с готовыми частями
+            output_dir = PREVIEW_FOLDER_PATH
+    records = collect_image_records(root_dir, streaming=STREAMING_ORDER)
+    try:
+        render_archive(records, root_dir, output_dir, max_concurrent, shard, plan_only, started,
+                       every, date_from, date_to)
+    finally:
+        if isinstance(records, IndexedRecords):
+            records.close()
+
+def render_archive(records, root_dir, output_dir=RESULTS_FOLDER_PATH, max_concurrent=MAX_CONCURRENT_PARTS,
+                   shard=None, plan_only=False, started=None, every=1, date_from=None, date_to=None):
+    """Спланировать и отрендерить части для упорядоченных записей (см. main)."""
+    started = started or datetime.now()
+    if not records:
         logging.error("Изображения не найдены.")
         return
+    dedup_report = None
+    if DEDUP:
+        records, dedup_report = deduplicate_records(records, DEDUP_THRESHOLD, DEDUP_TIME_WINDOW)
+    if every > 1 or date_from or date_to:
+        # Выборка после дедупликации: предпросмотр показывает ту же хронологию
+        records = sample_records(records, every, date_from, date_to)
+        if not records:
+            logging.error("В выборке нет изображений.")
+            return
+    parts = plan_parts(records, output_dir, MAX_CLIPS_PER_PART, MAX_FILE_SIZE_MB,
+                       PART_SPLIT_BY, PHOTO_DURATION, BITRATE)
+    manifest = build_manifest(root_dir, records, parts)
 
-    part_number = 1
-    current_files = image_files
-
-    while current_files:
-        logging.info(f"Обработка части {part_number}...")
-        output_path, remaining_files = create_video_part(
-            current_files,
-            part_number,
-            RESULTS_FOLDER_PATH,
-            photo_duration=PHOTO_DURATION,
-            target_resolution=TARGET_RESOLUTION,
-            batch_size=BATCH_SIZE
-        )
-        if output_path:
-            logging.info(f"Завершена часть {part_number}")
+    exists = os.path.exists(output_dir)
+    previous = load_manifest(output_dir) if (RESUME or INCREMENTAL or shard) and exists else None
+    part_statuses = load_part_statuses(output_dir) if exists else None
+    restored = (RESUME or shard) and restore_progress(manifest, previous, part_statuses)
+    incremental_parts, reused = None, 0
+    if not restored and INCREMENTAL and previous:
+        incremental_parts, reused = plan_parts_incremental(
+            records, root_dir, previous, part_statuses, output_dir, MAX_CLIPS_PER_PART,
+            MAX_FILE_SIZE_MB, PART_SPLIT_BY, PHOTO_DURATION, BITRATE)
+        if incremental_parts is not None:
+            incremental_manifest = build_manifest(root_dir, records, incremental_parts)
+            # Прошлый план сам был инкрементальным и архив с тех пор не менялся
+            if (RESUME or shard) and restore_progress(incremental_manifest, previous, part_statuses):
+                parts, manifest, restored = incremental_parts, incremental_manifest, True
+
+    if restored:
+        logging.info(f"Продолжение прерванного запуска в папке: {output_dir}")
+    elif shard and previous:
+        # Папку могут использовать другие шарды: не очищаем её
+        logging.error(f"План в {output_dir} не совпадает с текущим архивом и настройками. "
+                      f"Пересоздайте его запуском с --plan-only.")
+        return
+    elif shard:
+        os.makedirs(output_dir, exist_ok=True)
+    elif reused:
+        parts, manifest = incremental_parts, incremental_manifest
+        reuse_part_files(output_dir, previous, parts)
+        clear_part_statuses(output_dir)
+        logging.info(f"Инкрементальный рендер: сохранено частей {reused} из {len(parts)}, "
+                     f"к рендеру {len(parts) - reused}")
+    else:
+        if not clear_output_dir(output_dir, get_output_patterns()):
+            logging.error(f"Папка {output_dir} не пуста и не содержит {MANIFEST_FILENAME}: "
+                          f"укажите пустую папку или папку прошлого запуска.")
+            return
+        if exists:
+            logging.info(f"Очищена папка: {output_dir}")
+        os.makedirs(output_dir, exist_ok=True)
+        logging.info(f"Создана папка: {output_dir}")
+    # Шарды не перезаписывают общий манифест: их прогресс — в файлах статусов частей
+    if not shard or not previous:
+        save_manifest(output_dir, manifest)
+    if dedup_report:
+        logging.info(f"Отчёт о дубликатах: {save_dedup_report(output_dir, dedup_report)}")
+    part_reports = []
+
+    def write_report():
+        report = build_run_report(started, root_dir, records, parts, part_reports, shard, max_concurrent)
+        report_path = save_run_report(output_dir, report, parse_shard(shard) if shard else None)
+        log_run_summary(report, report_path)
+
+    if plan_only:
+        logging.info(f"План сохранён: {len(parts)} частей")
+        write_report()
+        return
+
+    pending_parts = []
+    for part in (select_shard_parts(manifest["parts"], shard) if shard else manifest["parts"]):
+        if is_part_complete(part, output_dir, VERIFY_CHECKSUMS_ON_RESUME):
+            logging.info(f"Часть {part['part_number']} уже готова: {part['output']}")
         else:
-            logging.error(f"Не удалось создать часть {part_number}")
-            break
-        current_files = remaining_files
-        part_number += 1
+            pending_parts.append(part)
+
+    failed_parts = []
+    parts_by_number = {part["part_number"]: part for part in manifest["parts"]}
+
+    def on_part_done(part):
+        part = dict(part)
+        metrics = part.pop("metrics", None)
+        if metrics:
+            part_reports.append(dict(metrics, part_number=part["part_number"], status=part["status"]))
+        parts_by_number[part["part_number"]].update(part)
+        if part["status"] != "complete":
+            failed_parts.append(part["part_number"])
+        save_part_status(output_dir, part)
+        if not shard:
+            save_manifest(output_dir, manifest)
+
+    try:
+        render_parts(pending_parts, records, output_dir, on_part_done, max_concurrent, WORKER_MEMORY_LIMIT_MB)
+    finally:
+        # Отчёт пишется и при прерывании: в нём видно, какие части успели
+        write_report()
+
+    if failed_parts:
+        logging.error(f"Не созданы части: {sorted(failed_parts)}. Повторный запуск пересоздаст только их.")
 
 if __name__ == "__main__":
     # Установка необходимых библиотек:
     # pip install moviepy==1.0.3 opencv-python numpy psutil Pillow
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Хронологическое видео из фотографий")
+    parser.add_argument("--root", default=ROOT_DIRECTORY, help="папка с фотографиями")
+    parser.add_argument("--output", help="папка результатов (по умолчанию RESULTS_FOLDER_PATH, "
+                                         "для --preview — PREVIEW_FOLDER_PATH)")
+    parser.add_argument("--parallel", type=int, default=MAX_CONCURRENT_PARTS,
+                        help="сколько частей рендерить одновременно")
+    parser.add_argument("--shard", help="K/N: рендерить только K-ю долю из N (для нескольких машин)")
+    parser.add_argument("--plan-only", action="store_true", help="только сохранить план частей")
+    parser.add_argument("--verbose", action="store_true", help="подробный лог по каждому файлу (DEBUG)")
+    parser.add_argument("--preview", action="store_true",
+                        help="быстрый предпросмотр в PREVIEW_RESOLUTION для проверки порядка, дат и текста")
+    parser.add_argument("--every", type=int, default=1, help="взять каждое N-е фото (только с --preview)")
+    parser.add_argument("--from", dest="date_from", help="первая дата выборки (YYYY-MM-DD, только с --preview)")
+    parser.add_argument("--to", dest="date_to", help="последняя дата выборки включительно (YYYY-MM-DD, только с --preview)")
+    args = parser.parse_args()
+    if args.verbose:
+        logging.getLogger().setLevel(logging.DEBUG)
+    if args.every < 1:
+        parser.error("--every должно быть не меньше 1")
+    if (args.every > 1 or args.date_from or args.date_to) and not args.preview:
+        parser.error("--every, --from и --to работают только с --preview")
+    for value in (args.date_from, args.date_to):
+        try:
+            if value:
+                parse_date(value)
+        except ValueError:
+            parser.error(f"Дата должна иметь вид YYYY-MM-DD, получено: {value}")
+    output_dir = args.output or (PREVIEW_FOLDER_PATH if args.preview else RESULTS_FOLDER_PATH)
+    main(args.root, output_dir=output_dir, max_concurrent=args.parallel,
+         shard=args.shard, plan_only=args.plan_only, preview=args.preview,
+         every=args.every, date_from=args.date_from, date_to=args.date_to)
\ No newline at end of file
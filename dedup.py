@@ -0,0 +1,136 @@
+import os
+import hashlib
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+from metadata_index import load_hashes, save_hashes
+
+# Глобальные переменные
+HASH_SIZE = 8  # dHash 8x8 = 64 бита (миниатюра 9x8 в оттенках серого)
+DEDUP_BATCH_SIZE = 256  # Изображений в одной порции хеширования
+CONTENT_HASH_CHUNK_SIZE = 4 * 1024 * 1024  # Чтение по 4 МиБ при подсчёте хеша содержимого
+THUMBNAIL_DECODE_EXTENSIONS = {'.jpg', '.jpeg'}  # Форматы с декодированием сразу в 1/8 размера
+
+# Число единичных битов для каждого байта (popcount по таблице)
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def load_thumbnail(file_path, hash_size=HASH_SIZE):
+    """Миниатюра (hash_size x hash_size+1) в оттенках серого для dHash (None, если не читается)."""
+    ext = os.path.splitext(file_path)[1].lower()
+    flags = cv2.IMREAD_REDUCED_GRAYSCALE_8 if ext in THUMBNAIL_DECODE_EXTENSIONS else cv2.IMREAD_GRAYSCALE
+    try:
+        image = cv2.imread(file_path, flags)
+        if image is None:
+            return None
+        return cv2.resize(image, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    except Exception as e:
+        logging.warning(f"Не удалось построить миниатюру {file_path}: {e}")
+        return None
+
+
+def dhash_batch(thumbnails):
+    """dHash порции миниатюр одной операцией NumPy: массив uint64."""
+    if not thumbnails:
+        return np.empty(0, dtype=np.uint64)
+    stack = np.stack(thumbnails).astype(np.int16)
+    bits = stack[:, :, 1:] > stack[:, :, :-1]
+    packed = np.packbits(bits.reshape(len(thumbnails), -1), axis=1)
+    return packed.view(">u8").ravel().astype(np.uint64)
+
+
+def hamming_distances(value, hashes):
+    """Расстояния Хэмминга от value до каждого хеша массива hashes (uint64)."""
+    xor = np.ascontiguousarray(hashes ^ np.uint64(value))
+    return _POPCOUNT[xor.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+def content_hash(file_path):
+    """SHA-1 содержимого файла (для точных копий)."""
+    digest = hashlib.sha1()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(CONTENT_HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _hash_batch(records, duplicate_sizes, executor, conn):
+    """dHash и хеш содержимого для порции записей: из кэша индекса или заново."""
+    cached = load_hashes(conn, records) if conn else {}
+    missing = [record for record in records if record.path not in cached]
+    thumbnails = list(executor.map(load_thumbnail, (record.path for record in missing)))
+    readable = [(record, thumb) for record, thumb in zip(missing, thumbnails) if thumb is not None]
+    computed = dhash_batch([thumb for _, thumb in readable])
+    hashes = {path: list(values) for path, values in cached.items()}
+    for record in missing:
+        hashes[record.path] = [None, None]
+    for (record, _), value in zip(readable, computed):
+        hashes[record.path][0] = int(value)
+
+    updated = list(missing)
+    for record in records:
+        # Хеш содержимого нужен только файлам, размер которых встречается больше одного раза
+        if record.size in duplicate_sizes and hashes[record.path][1] is None:
+            try:
+                hashes[record.path][1] = content_hash(record.path)
+            except OSError as e:
+                logging.warning(f"Не удалось прочитать {record.path}: {e}")
+                continue
+            if record.path in cached:
+                updated.append(record)
+    if conn and updated:
+        save_hashes(conn, [(record.path, record.size, record.mtime_ns, *hashes[record.path])
+                           for record in updated])
+    return hashes
+
+
+def find_duplicates(records, duplicate_sizes, threshold, time_window, workers=1, conn=None):
+    """Найти точные копии и почти одинаковые снимки в хронологическом порядке записей.
+
+    Точная копия — тот же хеш содержимого (на любом расстоянии во времени).
+    Почти одинаковый снимок — dHash отличается не больше чем на threshold
+    бит от оставленного снимка не дальше time_window секунд (серии).
+    Остаётся первый снимок группы. Записи читаются одним проходом; conn —
+    индекс для кэша хешей. Возвращает список отброшенных:
+    {"path", "duplicate_of", "reason" ("exact" или "similar"), "distance"}.
+    """
+    dropped = []
+    exact = {}  # хеш содержимого -> оставленный снимок
+    window = deque()  # (timestamp, dhash, path) оставленных снимков в окне
+    batch = []
+
+    def process(batch, executor):
+        hashes = _hash_batch(batch, duplicate_sizes, executor, conn)
+        for record in batch:
+            dhash, digest = hashes[record.path]
+            if digest and digest in exact:
+                dropped.append({"path": record.path, "duplicate_of": exact[digest],
+                                "reason": "exact", "distance": 0})
+                continue
+            while window and record.timestamp - window[0][0] > time_window:
+                window.popleft()
+            representative = record.path
+            if dhash is not None and window:
+                distances = hamming_distances(dhash, np.fromiter((item[1] for item in window),
+                                                                 dtype=np.uint64, count=len(window)))
+                nearest = int(np.argmin(distances))
+                if distances[nearest] <= threshold:
+                    representative = window[nearest][2]
+                    dropped.append({"path": record.path, "duplicate_of": representative,
+                                    "reason": "similar", "distance": int(distances[nearest])})
+            if digest:
+                exact.setdefault(digest, representative)
+            if representative == record.path and dhash is not None:
+                window.append((record.timestamp, dhash, record.path))
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for record in records:
+            batch.append(record)
+            if len(batch) >= DEDUP_BATCH_SIZE:
+                process(batch, executor)
+                batch = []
+        if batch:
+            process(batch, executor)
+    return dropped
@@ -0,0 +1,296 @@
+import os
+import re
+import json
+import shutil
+import logging
+import subprocess
+import tempfile
+from fractions import Fraction
+import numpy as np
+
+# Параметры видеопотока, которые должны совпадать для склейки без перекодирования
+STREAM_COPY_KEYS = ("codec", "profile", "pix_fmt", "width", "height", "frame_rate", "time_base")
+
+# Профили кодирования: режим управления битрейтом и раскладка кадров.
+# Битрейт задаёт вызывающий (BITRATE): для "cbr" это целевой битрейт,
+# для остальных — потолок (-maxrate), на который опирается прогноз размера.
+#   crf — качество (меньше — лучше), tune — настройка x264,
+#   keyframe_per_photo — ключевой кадр на границе каждого фото,
+#   one_frame_per_photo — один кадр на фото длительностью PHOTO_DURATION
+ENCODING_PROFILES = {
+    "cbr": {"preset": "medium"},
+    "crf": {"preset": "medium", "crf": 20},
+    "stillimage": {"preset": "medium", "crf": 20, "tune": "stillimage", "keyframe_per_photo": True},
+    "vfr": {"preset": "medium", "crf": 20, "tune": "stillimage", "one_frame_per_photo": True},
+    # Быстрый предпросмотр: качество вторично, важна скорость
+    "preview": {"preset": "ultrafast", "crf": 30, "one_frame_per_photo": True},
+}
+
+# Разбор строки потока из вывода "ffmpeg -i", если ffprobe недоступен:
+# Stream #0:0[0x1](und): Video: h264 (High) (avc1 / 0x31637661), yuv420p(progressive), 1920x1080, ..., 1 fps, 1 tbr, 16384 tbn
+_STREAM_CODEC_PATTERN = re.compile(r"Video: (?P<codec>\w+)(?: \((?P<profile>[^)]*)\))?")
+_STREAM_FORMAT_PATTERN = re.compile(r", (?P<pix_fmt>\w+)(?:\([^)]*\))?, (?P<width>\d+)x(?P<height>\d+)")
+_STREAM_FPS_PATTERN = re.compile(r"(?P<fps>[\d.]+k?) fps")
+_STREAM_TBN_PATTERN = re.compile(r"(?P<tbn>[\d.]+k?) tbn")
+
+
+def get_ffmpeg_binary():
+    """Найти ffmpeg: тот же, что использует moviepy, иначе из PATH."""
+    try:
+        from moviepy.config import get_setting
+        return get_setting("FFMPEG_BINARY")
+    except Exception as e:
+        logging.warning(f"ffmpeg из moviepy недоступен, ищем в PATH: {e}")
+        return shutil.which("ffmpeg") or "ffmpeg"
+
+
+def parse_bitrate(bitrate):
+    """Перевести битрейт ffmpeg ("12M", "800k", "5000000") в бит/с."""
+    multipliers = {"k": 1000, "m": 1000 ** 2, "g": 1000 ** 3}
+    value = str(bitrate).strip().lower()
+    if value and value[-1] in multipliers:
+        return float(value[:-1]) * multipliers[value[-1]]
+    return float(value)
+
+
+def get_profile_settings(profile_name, photo_duration, fps, bitrate):
+    """Параметры кодирования профиля для заданной длительности фото.
+
+    Возвращает словарь: stream_fps (строка для -r), frames_per_photo,
+    preset, bitrate (для -b:v или None) и params (прочие аргументы ffmpeg).
+    """
+    if profile_name not in ENCODING_PROFILES:
+        raise ValueError(f"Неизвестный профиль кодирования: {profile_name}. "
+                         f"Доступны: {', '.join(ENCODING_PROFILES)}")
+    profile = ENCODING_PROFILES[profile_name]
+    params = []
+    target_bitrate = bitrate
+    if "crf" in profile:
+        target_bitrate = None
+        params += ["-crf", str(profile["crf"]), "-maxrate", str(bitrate),
+                   "-bufsize", f"{parse_bitrate(bitrate) * 2:.0f}"]
+    if profile.get("tune"):
+        params += ["-tune", profile["tune"]]
+
+    if profile.get("one_frame_per_photo"):
+        stream_fps = str(1 / Fraction(photo_duration).limit_denominator(1000))
+        frames_per_photo = 1
+    else:
+        stream_fps = str(fps)
+        frames_per_photo = max(1, int(round(photo_duration * fps)))
+        if profile.get("keyframe_per_photo"):
+            params += ["-force_key_frames", f"expr:gte(t,n_forced*{photo_duration})"]
+
+    return {
+        "stream_fps": stream_fps,
+        "frames_per_photo": frames_per_photo,
+        "preset": profile["preset"],
+        "bitrate": target_bitrate,
+        "params": params,
+    }
+
+
+def moviepy_encoder_kwargs(settings):
+    """Аргументы write_videofile moviepy для параметров профиля."""
+    ffmpeg_params = ["-an"]
+    if settings["bitrate"]:
+        ffmpeg_params += ["-b:v", str(settings["bitrate"])]
+    return {
+        "codec": "libx264",
+        "fps": float(Fraction(settings["stream_fps"])),
+        "audio": False,
+        "ffmpeg_params": ffmpeg_params + settings["params"],
+        "preset": settings["preset"],
+    }
+
+
+def get_ffprobe_binary():
+    """Найти ffprobe рядом с ffmpeg или в PATH (None, если его нет)."""
+    ffmpeg = get_ffmpeg_binary()
+    candidate = os.path.join(os.path.dirname(ffmpeg), "ffprobe" + (".exe" if os.name == "nt" else ""))
+    if os.path.dirname(ffmpeg) and os.path.exists(candidate):
+        return candidate
+    return shutil.which("ffprobe")
+
+
+def _probe_with_ffprobe(ffprobe, path):
+    """Параметры первого видеопотока через ffprobe."""
+    result = subprocess.run(
+        [ffprobe, "-v", "error", "-select_streams", "v:0", "-print_format", "json",
+         "-show_entries", "stream=codec_name,profile,pix_fmt,width,height,r_frame_rate,time_base",
+         path],
+        capture_output=True, text=True, check=True
+    )
+    stream = json.loads(result.stdout)["streams"][0]
+    return {
+        "codec": stream.get("codec_name"),
+        "profile": stream.get("profile"),
+        "pix_fmt": stream.get("pix_fmt"),
+        "width": stream.get("width"),
+        "height": stream.get("height"),
+        "frame_rate": stream.get("r_frame_rate"),
+        "time_base": stream.get("time_base"),
+    }
+
+
+def _probe_with_ffmpeg(path):
+    """Параметры первого видеопотока по выводу "ffmpeg -i"."""
+    result = subprocess.run([get_ffmpeg_binary(), "-hide_banner", "-i", path],
+                            capture_output=True, text=True)
+    line = next((line for line in result.stderr.splitlines() if "Video:" in line), None)
+    codec = _STREAM_CODEC_PATTERN.search(line) if line else None
+    video_format = _STREAM_FORMAT_PATTERN.search(line) if line else None
+    if not codec or not video_format:
+        raise IOError(f"Видеопоток не найден в {path}")
+    fps = _STREAM_FPS_PATTERN.search(line)
+    tbn = _STREAM_TBN_PATTERN.search(line)
+    return {
+        "codec": codec.group("codec"),
+        "profile": codec.group("profile"),
+        "pix_fmt": video_format.group("pix_fmt"),
+        "width": int(video_format.group("width")),
+        "height": int(video_format.group("height")),
+        "frame_rate": fps.group("fps") if fps else None,
+        "time_base": tbn.group("tbn") if tbn else None,
+    }
+
+
+def probe_video_stream(path):
+    """Получить параметры видеопотока файла (кодек, профиль, размер, FPS и т.д.)."""
+    ffprobe = get_ffprobe_binary()
+    if ffprobe:
+        try:
+            return _probe_with_ffprobe(ffprobe, path)
+        except Exception as e:
+            logging.warning(f"ffprobe не смог прочитать {path}, используем ffmpeg -i: {e}")
+    return _probe_with_ffmpeg(path)
+
+
+def check_stream_copy_compatible(paths):
+    """Проверить, можно ли склеить файлы без перекодирования.
+
+    Возвращает (True, "") или (False, причина).
+    """
+    reference = None
+    for path in paths:
+        try:
+            params = {key: probe_video_stream(path)[key] for key in STREAM_COPY_KEYS}
+        except Exception as e:
+            return False, f"не удалось прочитать параметры {path}: {e}"
+        if reference is None:
+            reference = (path, params)
+            continue
+        differing = [key for key in STREAM_COPY_KEYS if params[key] != reference[1][key]]
+        if differing:
+            details = ", ".join(f"{key}: {reference[1][key]} != {params[key]}" for key in differing)
+            return False, f"{os.path.basename(path)} отличается от {os.path.basename(reference[0])} ({details})"
+    return True, ""
+
+
+def concat_stream_copy(paths, output_path):
+    """Склеить видео через concat demuxer ffmpeg без перекодирования (-c copy)."""
+    list_fd, list_path = tempfile.mkstemp(prefix="concat_", suffix=".txt",
+                                          dir=os.path.dirname(os.path.abspath(output_path)))
+    try:
+        with os.fdopen(list_fd, "w", encoding="utf-8") as f:
+            for path in paths:
+                escaped = os.path.abspath(path).replace("\\", "/").replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+        result = subprocess.run(
+            [get_ffmpeg_binary(), "-y", "-loglevel", "error", "-f", "concat", "-safe", "0",
+             "-i", list_path, "-c", "copy", "-movflags", "+faststart", output_path],
+            capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            raise IOError(f"ffmpeg concat вернул код {result.returncode}: {result.stderr.strip()}")
+    finally:
+        os.remove(list_path)
+    return output_path
+
+
+class FFmpegFrameWriter:
+    """Долгоживущий процесс ffmpeg, принимающий RGB-кадры через stdin.
+
+    Кадры передаются как rawvideo, поэтому нет ни временных PNG, ни
+    промежуточных файлов, ни повторного кодирования.
+    """
+
+    def __init__(self, output_path, size, fps, codec="libx264", preset="medium",
+                 bitrate=None, ffmpeg_params=None, threads=None):
+        self.output_path = output_path
+        self.size = tuple(size)
+        self.frames_written = 0
+        width, height = self.size
+        cmd = [
+            get_ffmpeg_binary(), "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-vcodec", "rawvideo",
+            "-s", f"{width}x{height}", "-pix_fmt", "rgb24",
+            "-r", str(fps), "-i", "-",
+            "-an", "-vcodec", codec, "-preset", preset,
+        ]
+        if bitrate:
+            cmd += ["-b:v", bitrate]
+        if threads:
+            cmd += ["-threads", str(threads)]
+        if ffmpeg_params:
+            cmd += list(ffmpeg_params)
+        cmd += ["-pix_fmt", "yuv420p", output_path]
+        self._stderr = tempfile.TemporaryFile()
+        self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                      stderr=self._stderr)
+
+    def _error_output(self):
+        """Прочитать сообщения ffmpeg об ошибках."""
+        self._stderr.seek(0)
+        return self._stderr.read().decode("utf-8", errors="replace").strip()
+
+    def write_frame(self, frame, repeat=1):
+        """Записать кадр (H, W, 3, uint8, RGB) repeat раз подряд."""
+        height, width = frame.shape[:2]
+        if (width, height) != self.size or frame.dtype != np.uint8:
+            raise ValueError(f"Кадр {width}x{height} {frame.dtype} не соответствует {self.size[0]}x{self.size[1]} uint8")
+        data = memoryview(np.ascontiguousarray(frame)).cast("B")
+        try:
+            for _ in range(repeat):
+                self._proc.stdin.write(data)
+        except (BrokenPipeError, OSError) as e:
+            self._proc.wait()
+            raise IOError(f"ffmpeg завершился при записи {self.output_path}: {self._error_output() or e}")
+        self.frames_written += repeat
+
+    def close(self):
+        """Дождаться завершения кодирования и проверить результат."""
+        if self._proc is None:
+            return
+        try:
+            self._proc.stdin.close()
+        except (BrokenPipeError, OSError):
+            pass
+        returncode = self._proc.wait()
+        error_output = self._error_output()
+        self._proc = None
+        self._stderr.close()
+        if returncode != 0:
+            raise IOError(f"ffmpeg вернул код {returncode} для {self.output_path}: {error_output}")
+
+    def abort(self):
+        """Прервать кодирование и удалить недописанный файл."""
+        if self._proc is not None:
+            self._proc.kill()
+            self._proc.wait()
+            self._proc = None
+            self._stderr.close()
+        if os.path.exists(self.output_path):
+            os.remove(self.output_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
@@ -0,0 +1,126 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+import cv2
+import numpy as np
+
+# Глобальные переменные
+FRAME_CACHE_EVICT_TO = 0.9  # После вытеснения кэш занимает не больше этой доли бюджета
+PNG_COMPRESSION = 1  # Быстрое сжатие PNG (0-9): кадр из кэша должен читаться быстрее, чем готовиться заново
+
+
+def frame_cache_key(file_path, size, mtime_ns, text, pixel_settings):
+    """Ключ кадра: файл (путь, размер, mtime), текст наложения и настройки, влияющие на пиксели."""
+    data = json.dumps([file_path, size, mtime_ns, text, pixel_settings],
+                      sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(data.encode("utf-8", errors="surrogateescape")).hexdigest()
+
+
+class FrameCache:
+    """Кэш готовых кадров на диске с бюджетом размера и вытеснением по LRU.
+
+    Кадр хранится сжатым PNG ("png") или как несжатый .npy, который читается
+    через memory map ("raw"). Время последнего использования — mtime файла:
+    при попадании он обновляется, при переполнении удаляются самые старые.
+    Запись атомарна, поэтому кэш можно использовать из нескольких процессов.
+    """
+
+    def __init__(self, cache_dir, max_mb, storage="png"):
+        if storage not in ("png", "raw"):
+            raise ValueError(f"Неизвестный формат кэша кадров: {storage}")
+        self.cache_dir = cache_dir
+        self.max_bytes = max_mb * 1024 * 1024
+        self.storage = storage
+        self._extension = ".png" if storage == "png" else ".npy"
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._total_bytes = sum(size for _, size, _ in self._entries())
+
+    def _path(self, key):
+        """Путь кадра: два уровня каталогов по префиксу ключа."""
+        return os.path.join(self.cache_dir, key[:2], key + self._extension)
+
+    def _entries(self):
+        """Файлы кэша: (путь, размер, mtime)."""
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith((".png", ".npy")):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime_ns
+
+    def contains(self, key):
+        """Есть ли кадр в кэше (без чтения)."""
+        return os.path.exists(self._path(key))
+
+    def get(self, key):
+        """Кадр из кэша (RGB, uint8) или None."""
+        path = self._path(key)
+        try:
+            if self.storage == "raw":
+                frame = np.load(path, mmap_mode="r")
+            else:
+                # Байты читаются сами: на промахе cv2.imread печатал бы предупреждение в stderr.
+                # PNG хранит каналы в том порядке, в котором их записали (RGB), без конвертации
+                with open(path, "rb") as f:
+                    data = np.frombuffer(f.read(), dtype=np.uint8)
+                frame = cv2.imdecode(data, cv2.IMREAD_UNCHANGED)
+            if frame is None:
+                return None
+            os.utime(path)
+            return frame
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, frame):
+        """Сохранить кадр и вытеснить старые, если бюджет превышен."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            if self.storage == "raw":
+                with open(temp_path, "wb") as f:
+                    np.save(f, np.ascontiguousarray(frame))
+            else:
+                ok, data = cv2.imencode(".png", frame, [cv2.IMWRITE_PNG_COMPRESSION, PNG_COMPRESSION])
+                if not ok:
+                    raise IOError("Не удалось сжать кадр")
+                with open(temp_path, "wb") as f:
+                    f.write(data.tobytes())
+            os.replace(temp_path, path)
+        except Exception as e:
+            logging.warning(f"Не удалось сохранить кадр в кэш {path}: {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+        with self._lock:
+            self._total_bytes += os.path.getsize(path)
+            over_budget = self._total_bytes > self.max_bytes
+        if over_budget:
+            self.evict()
+
+    def evict(self):
+        """Удалить давно не использованные кадры до FRAME_CACHE_EVICT_TO бюджета."""
+        with self._lock:
+            entries = sorted(self._entries(), key=lambda entry: entry[2])
+            total = sum(size for _, size, _ in entries)
+            target = self.max_bytes * FRAME_CACHE_EVICT_TO
+            removed = 0
+            for path, size, _ in entries:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                removed += 1
+            self._total_bytes = total
+        if removed:
+            logging.info(f"Кэш кадров: вытеснено {removed} кадров, занято {total / 1024 / 1024:.0f} MiB")
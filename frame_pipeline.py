@@ -0,0 +1,76 @@
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
+import numpy as np
+
+
+def _run_now(func, item):
+    """Выполнить func в текущем потоке и вернуть результат как Future."""
+    future = Future()
+    try:
+        future.set_result(func(item))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def iter_ordered(func, items, workers=1, max_in_flight=None):
+    """Применить func к items в пуле потоков, выдавая (item, Future) по порядку.
+
+    Одновременно в работе не больше max_in_flight элементов, поэтому память
+    ограничена независимо от длины items. Ошибка func не прерывает обход:
+    она поднимется при вызове future.result() для своего элемента.
+    """
+    if workers <= 1:
+        for item in items:
+            yield item, _run_now(func, item)
+        return
+
+    max_in_flight = max(workers, max_in_flight or 2 * workers)
+    pending = deque()
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        for item in items:
+            pending.append((item, executor.submit(func, item)))
+            if len(pending) >= max_in_flight:
+                yield pending.popleft()
+        while pending:
+            yield pending.popleft()
+    finally:
+        # Потребитель мог остановиться раньше: неначатые задачи не нужны
+        for _, future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+
+class CanvasPool:
+    """Пул переиспользуемых кадров (H, W, 3, uint8) точного целевого размера.
+
+    Кадры выделяются заранее и возвращаются в пул после записи, поэтому
+    длинная часть не создаёт новый массив на каждый кадр. Если все кадры
+    заняты, выделяется ещё один: пул растёт до реального числа кадров в
+    работе и не блокирует потоки подготовки.
+    """
+
+    def __init__(self, size, count=0):
+        self.size = tuple(size)
+        self._lock = threading.Lock()
+        self._free = [self._allocate() for _ in range(count)]
+        self.allocated = count
+
+    def _allocate(self):
+        width, height = self.size
+        return np.empty((height, width, 3), dtype=np.uint8)
+
+    def acquire(self):
+        """Взять свободный кадр (содержимое не очищено)."""
+        with self._lock:
+            if self._free:
+                return self._free.pop()
+            self.allocated += 1
+        return self._allocate()
+
+    def release(self, canvas):
+        """Вернуть кадр в пул."""
+        with self._lock:
+            self._free.append(canvas)
@@ -0,0 +1,204 @@
+import struct
+import logging
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+# Глобальные переменные
+MAX_PNG_CHUNKS = 64  # Сколько чанков PNG просматривать до IDAT в поисках eXIf
+MAX_IFD_ENTRIES = 1024  # Защита от повреждённых IFD
+
+# Метаданные из заголовка файла: размеры (как хранятся, без учёта ориентации),
+# timestamp съёмки из EXIF (None, если нет) и ориентация EXIF (1 — без поворота)
+ImageHeader = namedtuple("ImageHeader", ["width", "height", "timestamp", "orientation"])
+EMPTY_HEADER = ImageHeader(0, 0, None, 1)
+
+# Теги TIFF/EXIF
+_TAG_IMAGE_WIDTH = 0x0100
+_TAG_IMAGE_LENGTH = 0x0101
+_TAG_ORIENTATION = 0x0112
+_TAG_EXIF_IFD = 0x8769
+_TAG_DATETIME_ORIGINAL = 0x9003
+_TAG_DATETIME_DIGITIZED = 0x9004
+_TAG_OFFSET_TIME_ORIGINAL = 0x9011
+_TAG_OFFSET_TIME_DIGITIZED = 0x9012
+
+# Размеры типов TIFF: BYTE, ASCII, SHORT, LONG, RATIONAL, SBYTE, UNDEFINED, SSHORT, SLONG, SRATIONAL
+_TIFF_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1, 7: 1, 8: 2, 9: 4, 10: 8}
+
+# Маркеры JPEG SOF (кроме DHT 0xC4, JPG 0xC8 и DAC 0xCC) — в них размеры кадра
+_JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def _read_exact(f, size):
+    """Прочитать ровно size байт (ошибка, если файл короче)."""
+    data = f.read(size)
+    if len(data) != size:
+        raise ValueError("Неожиданный конец файла")
+    return data
+
+
+def _read_ifd(read, offset, endian):
+    """Прочитать IFD TIFF: {tag: значение} для коротких целых и строк.
+
+    read(offset, size) возвращает байты блока TIFF (из памяти или файла).
+    """
+    count = struct.unpack(endian + "H", read(offset, 2))[0]
+    if count > MAX_IFD_ENTRIES:
+        raise ValueError(f"Слишком много записей IFD: {count}")
+    table = read(offset + 2, count * 12)
+    entries = {}
+    for i in range(count):
+        tag, value_type, value_count, value_offset = struct.unpack_from(endian + "HHI4s", table, i * 12)
+        size = _TIFF_TYPE_SIZES.get(value_type, 0) * value_count
+        if not size or value_type not in (2, 3, 4):
+            continue
+        if size <= 4:
+            raw = value_offset[:size]
+        elif value_type == 2 and size <= 256:
+            raw = read(struct.unpack(endian + "I", value_offset)[0], size)
+        else:
+            continue
+        if value_type == 2:
+            entries[tag] = raw.split(b"\0", 1)[0].decode("ascii", errors="replace").strip()
+        elif value_type == 3:
+            entries[tag] = struct.unpack(endian + "H", raw[:2])[0]
+        elif value_type == 4:
+            entries[tag] = struct.unpack(endian + "I", raw[:4])[0]
+    return entries
+
+
+def parse_exif_datetime(value, offset=None):
+    """Перевести дату EXIF ("YYYY:MM:DD HH:MM:SS", смещение "+03:00") в timestamp."""
+    if not value:
+        return None
+    try:
+        dt = datetime.strptime(value[:19], "%Y:%m:%d %H:%M:%S")
+    except ValueError:
+        return None  # В том числе "0000:00:00 00:00:00" у камер без часов
+    if offset and len(offset) >= 6 and offset[0] in "+-":
+        try:
+            hours, minutes = int(offset[1:3]), int(offset[4:6])
+            delta = timedelta(hours=hours, minutes=minutes)
+            dt = dt.replace(tzinfo=timezone(delta if offset[0] == "+" else -delta))
+        except ValueError:
+            pass
+    # Без смещения время считается локальным, как и время из имени файла
+    return int(dt.timestamp())
+
+
+def _bytes_reader(data):
+    """read(offset, size) для блока TIFF в памяти."""
+    def read(offset, size):
+        chunk = data[offset:offset + size]
+        if len(chunk) != size:
+            raise ValueError("Смещение TIFF за пределами блока")
+        return chunk
+    return read
+
+
+def _file_reader(f):
+    """read(offset, size) для файла TIFF: читаются только нужные байты."""
+    def read(offset, size):
+        f.seek(offset)
+        return _read_exact(f, size)
+    return read
+
+
+def parse_tiff_metadata(read):
+    """Разобрать блок TIFF (файл TIFF или EXIF из JPEG/PNG): ImageHeader."""
+    byte_order = read(0, 8)
+    if byte_order[:2] == b"II":
+        endian = "<"
+    elif byte_order[:2] == b"MM":
+        endian = ">"
+    else:
+        raise ValueError("Неизвестный порядок байт TIFF")
+    ifd0 = _read_ifd(read, struct.unpack_from(endian + "I", byte_order, 4)[0], endian)
+    exif = {}
+    if _TAG_EXIF_IFD in ifd0:
+        exif = _read_ifd(read, ifd0[_TAG_EXIF_IFD], endian)
+
+    timestamp = (parse_exif_datetime(exif.get(_TAG_DATETIME_ORIGINAL), exif.get(_TAG_OFFSET_TIME_ORIGINAL)) or
+                 parse_exif_datetime(exif.get(_TAG_DATETIME_DIGITIZED), exif.get(_TAG_OFFSET_TIME_DIGITIZED)))
+    return ImageHeader(ifd0.get(_TAG_IMAGE_WIDTH, 0), ifd0.get(_TAG_IMAGE_LENGTH, 0),
+                       timestamp, ifd0.get(_TAG_ORIENTATION, 1))
+
+
+def _read_jpeg_header(f):
+    """Заголовок JPEG: сегмент APP1 (EXIF) и размеры из SOF, без чтения данных скана."""
+    exif = EMPTY_HEADER
+    while True:
+        marker = _read_exact(f, 2)
+        while marker[0] != 0xFF or marker[1] == 0xFF:
+            # Заполняющие байты 0xFF перед маркером
+            marker = marker[1:] + _read_exact(f, 1)
+        code = marker[1]
+        if code in (0xD8, 0x01) or 0xD0 <= code <= 0xD7:
+            continue  # Маркеры без длины
+        if code == 0xD9 or code == 0xDA:
+            raise ValueError("Маркер SOF не найден до начала скана")
+        length = struct.unpack(">H", _read_exact(f, 2))[0]
+        if length < 2:
+            raise ValueError("Некорректная длина сегмента JPEG")
+        if code == 0xE1 and exif is EMPTY_HEADER:
+            segment = _read_exact(f, length - 2)
+            if segment.startswith(b"Exif\0\0"):
+                try:
+                    exif = parse_tiff_metadata(_bytes_reader(segment[6:]))
+                except (ValueError, struct.error) as e:
+                    logging.debug(f"Некорректный EXIF: {e}")
+            continue
+        if code in _JPEG_SOF_MARKERS:
+            height, width = struct.unpack(">xHH", _read_exact(f, 5))
+            return ImageHeader(width, height, exif.timestamp, exif.orientation)
+        f.seek(length - 2, 1)
+
+
+def _read_png_header(f):
+    """Заголовок PNG: размеры из IHDR и EXIF из чанка eXIf (до IDAT)."""
+    length, chunk_type = struct.unpack(">I4s", _read_exact(f, 8))
+    if chunk_type != b"IHDR":
+        raise ValueError("PNG без IHDR")
+    width, height = struct.unpack(">II", _read_exact(f, 8))
+    f.seek(length - 8 + 4, 1)  # Остаток IHDR и CRC
+    for _ in range(MAX_PNG_CHUNKS):
+        header = f.read(8)
+        if len(header) != 8:
+            break
+        length, chunk_type = struct.unpack(">I4s", header)
+        if chunk_type in (b"IDAT", b"IEND"):
+            break
+        if chunk_type == b"eXIf":
+            exif = parse_tiff_metadata(_bytes_reader(_read_exact(f, length)))
+            return ImageHeader(width, height, exif.timestamp, exif.orientation)
+        f.seek(length + 4, 1)
+    return ImageHeader(width, height, None, 1)
+
+
+def read_image_header(file_path):
+    """Прочитать размеры и время съёмки из заголовка JPEG, PNG, TIFF, GIF или BMP.
+
+    Пиксели не декодируются: читаются только сегменты заголовка. Если формат
+    не распознан или заголовок повреждён, возвращается EMPTY_HEADER.
+    """
+    try:
+        with open(file_path, "rb") as f:
+            signature = f.read(8)
+            if signature[:2] == b"\xFF\xD8":
+                f.seek(2)
+                return _read_jpeg_header(f)
+            if signature == b"\x89PNG\r\n\x1a\n":
+                return _read_png_header(f)
+            if signature[:4] in (b"II*\0", b"MM\0*"):
+                # IFD может быть где угодно в файле: читаются только нужные смещения
+                return parse_tiff_metadata(_file_reader(f))
+            if signature[:6] in (b"GIF87a", b"GIF89a"):
+                width, height = struct.unpack("<HH", signature[6:8] + _read_exact(f, 2))
+                return ImageHeader(width, height, None, 1)
+            if signature[:2] == b"BM":
+                f.seek(18)
+                width, height = struct.unpack("<ii", _read_exact(f, 8))
+                return ImageHeader(width, abs(height), None, 1)
+    except (OSError, ValueError, struct.error) as e:
+        logging.debug(f"Не удалось прочитать заголовок {file_path}: {e}")
+    return EMPTY_HEADER
@@ -0,0 +1,256 @@
+import os
+import sqlite3
+import logging
+from collections import namedtuple
+
+# Глобальные переменные
+INDEX_SCHEMA_VERSION = 2  # При изменении схемы или разбора метаданных индекс пересоздаётся
+LOOKUP_BATCH_SIZE = 500  # Путей в одном запросе IN (лимит параметров SQLite — 999)
+FETCH_BATCH_SIZE = 1000  # Строк за одно чтение курсора при потоковом обходе
+
+# Запись индекса: всё, что нужно для сортировки и рендера без повторного чтения файла
+FileRecord = namedtuple(
+    "FileRecord",
+    ["path", "size", "mtime_ns", "sidecar_mtime_ns", "timestamp", "source",
+     "text", "text_format", "width", "height"]
+)
+
+_CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sidecar_mtime_ns INTEGER NOT NULL,
+    timestamp INTEGER NOT NULL,
+    source TEXT NOT NULL,
+    text TEXT NOT NULL,
+    text_format TEXT NOT NULL,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL
+)
+"""
+
+# Кэш хешей для поиска дубликатов: dHash (hex) и SHA-1 содержимого (NULL — ещё не считался)
+_CREATE_HASHES_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS image_hashes (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    dhash TEXT,
+    content_hash TEXT
+)
+"""
+
+
+def open_index(index_path):
+    """Открыть (или создать) SQLite-индекс метаданных."""
+    index_dir = os.path.dirname(index_path)
+    if index_dir:
+        os.makedirs(index_dir, exist_ok=True)
+    conn = sqlite3.connect(index_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version != INDEX_SCHEMA_VERSION:
+        if version:
+            logging.info(f"Схема индекса {index_path} устарела ({version}), индекс пересоздаётся")
+        conn.execute("DROP TABLE IF EXISTS files")
+        conn.execute("DROP TABLE IF EXISTS image_hashes")
+        conn.execute(_CREATE_TABLE_SQL)
+        conn.execute(f"PRAGMA user_version = {INDEX_SCHEMA_VERSION}")
+    conn.execute(_CREATE_HASHES_TABLE_SQL)
+    conn.commit()
+    return conn
+
+
+def _root_prefix(root_dir):
+    """Префикс путей каталога для выборки из индекса."""
+    return os.path.join(root_dir, "")
+
+
+def load_records(conn, root_dir):
+    """Загрузить записи индекса для каталога: {path: FileRecord}."""
+    prefix = _root_prefix(root_dir)
+    # substr вместо LIKE: в путях Windows встречаются '_' и '%'
+    rows = conn.execute(
+        "SELECT * FROM files WHERE substr(path, 1, ?) = ?",
+        (len(prefix), prefix)
+    )
+    return {row[0]: FileRecord(*row) for row in rows}
+
+
+def load_records_for_paths(conn, paths):
+    """Загрузить записи индекса для списка путей: {path: FileRecord}."""
+    records = {}
+    for i in range(0, len(paths), LOOKUP_BATCH_SIZE):
+        batch = paths[i:i + LOOKUP_BATCH_SIZE]
+        rows = conn.execute(
+            f"SELECT * FROM files WHERE path IN ({', '.join('?' * len(batch))})",
+            batch
+        )
+        records.update((row[0], FileRecord(*row)) for row in rows)
+    return records
+
+
+def is_record_fresh(record, size, mtime_ns, sidecar_mtime_ns, text_format):
+    """Проверить, что запись индекса соответствует файлу на диске."""
+    return (record is not None and
+            record.size == size and
+            record.mtime_ns == mtime_ns and
+            record.sidecar_mtime_ns == sidecar_mtime_ns and
+            record.text_format == text_format)
+
+
+def save_records(conn, records):
+    """Сохранить (обновить) записи в индексе."""
+    conn.executemany(
+        "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        records
+    )
+    conn.commit()
+
+
+def load_hashes(conn, records):
+    """Загрузить актуальные хеши записей: {path: (dhash, content_hash)}."""
+    hashes = {}
+    by_path = {record.path: record for record in records}
+    paths = list(by_path)
+    for i in range(0, len(paths), LOOKUP_BATCH_SIZE):
+        batch = paths[i:i + LOOKUP_BATCH_SIZE]
+        rows = conn.execute(
+            f"SELECT path, size, mtime_ns, dhash, content_hash FROM image_hashes "
+            f"WHERE path IN ({', '.join('?' * len(batch))})",
+            batch
+        )
+        for path, size, mtime_ns, dhash, digest in rows:
+            record = by_path[path]
+            if record.size == size and record.mtime_ns == mtime_ns:
+                hashes[path] = (int(dhash, 16) if dhash else None, digest)
+    return hashes
+
+
+def save_hashes(conn, rows):
+    """Сохранить хеши: (path, size, mtime_ns, dhash, content_hash)."""
+    conn.executemany(
+        "INSERT OR REPLACE INTO image_hashes VALUES (?, ?, ?, ?, ?)",
+        ((path, size, mtime_ns, f"{dhash:016x}" if dhash is not None else None, digest)
+         for path, size, mtime_ns, dhash, digest in rows)
+    )
+    conn.commit()
+
+
+def delete_missing_records(conn, known_paths, seen_paths):
+    """Удалить из индекса файлы, которых больше нет на диске."""
+    missing = [(path,) for path in known_paths if path not in seen_paths]
+    if missing:
+        conn.executemany("DELETE FROM files WHERE path = ?", missing)
+        conn.commit()
+        logging.info(f"Удалено из индекса отсутствующих файлов: {len(missing)}")
+    return len(missing)
+
+
+def begin_scan_order(conn):
+    """Начать запись порядка обхода во временную таблицу (на диске, а не в памяти)."""
+    conn.execute("PRAGMA temp_store = FILE")
+    conn.execute("DROP TABLE IF EXISTS temp.scan_order")
+    conn.execute("DROP TABLE IF EXISTS temp.sorted_order")
+    conn.execute("CREATE TEMP TABLE scan_order (ordinal INTEGER PRIMARY KEY, path TEXT NOT NULL UNIQUE)")
+
+
+def add_scan_order(conn, paths):
+    """Добавить пути в порядке обхода."""
+    conn.executemany("INSERT OR IGNORE INTO temp.scan_order (path) VALUES (?)", ((path,) for path in paths))
+
+
+def delete_unscanned_records(conn, root_dir):
+    """Удалить из индекса файлы каталога, не встреченные при обходе."""
+    prefix = _root_prefix(root_dir)
+    deleted = conn.execute(
+        "DELETE FROM files WHERE substr(path, 1, ?) = ? AND path NOT IN (SELECT path FROM temp.scan_order)",
+        (len(prefix), prefix)
+    ).rowcount
+    conn.commit()
+    if deleted:
+        logging.info(f"Удалено из индекса отсутствующих файлов: {deleted}")
+    return deleted
+
+
+class IndexedRecords:
+    """Записи обхода в хронологическом порядке, читаемые из индекса по мере надобности.
+
+    Порядок (timestamp, затем порядок обхода — как у стабильной сортировки
+    списка) один раз сохраняется во временную таблицу; сортирует SQLite,
+    сбрасывая данные на диск, поэтому память не зависит от числа файлов.
+    Поддерживаются len(), обход и срезы records[start:end].
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self._build_order(
+            "SELECT ROW_NUMBER() OVER (ORDER BY f.timestamp, s.ordinal) - 1, f.path "
+            "FROM temp.scan_order s JOIN files f ON f.path = s.path"
+        )
+
+    def _build_order(self, select_sql, params=()):
+        """Пересоздать таблицу порядка из запроса (position, path)."""
+        self.conn.execute("DROP TABLE IF EXISTS temp.sorted_order")
+        self.conn.execute("CREATE TEMP TABLE sorted_order (position INTEGER PRIMARY KEY, path TEXT NOT NULL)")
+        self.conn.execute(f"INSERT INTO temp.sorted_order (position, path) {select_sql}", params)
+        self.conn.commit()
+        self._length = self.conn.execute("SELECT COUNT(*) FROM temp.sorted_order").fetchone()[0]
+
+    def duplicate_sizes(self):
+        """Размеры файлов, встречающиеся больше одного раза (кандидаты в точные копии)."""
+        rows = self.conn.execute(
+            "SELECT f.size FROM temp.sorted_order s JOIN files f ON f.path = s.path "
+            "GROUP BY f.size HAVING COUNT(*) > 1"
+        )
+        return {row[0] for row in rows}
+
+    def exclude(self, paths):
+        """Убрать пути из порядка (позиции остальных пересчитываются)."""
+        self.conn.execute("DROP TABLE IF EXISTS temp.excluded")
+        self.conn.execute("CREATE TEMP TABLE excluded (path TEXT PRIMARY KEY)")
+        self.conn.executemany("INSERT OR IGNORE INTO temp.excluded VALUES (?)", ((path,) for path in paths))
+        self.conn.execute("ALTER TABLE temp.sorted_order RENAME TO previous_order")
+        self._build_order(
+            "SELECT ROW_NUMBER() OVER (ORDER BY position) - 1, path FROM temp.previous_order "
+            "WHERE path NOT IN (SELECT path FROM temp.excluded)"
+        )
+        self.conn.execute("DROP TABLE temp.previous_order")
+        self.conn.execute("DROP TABLE temp.excluded")
+
+    def __len__(self):
+        return self._length
+
+    def _iter_range(self, start, end):
+        """Записи с позициями [start, end)."""
+        cursor = self.conn.execute(
+            "SELECT f.* FROM temp.sorted_order s JOIN files f ON f.path = s.path "
+            "WHERE s.position >= ? AND s.position < ? ORDER BY s.position",
+            (start, end)
+        )
+        while True:
+            rows = cursor.fetchmany(FETCH_BATCH_SIZE)
+            if not rows:
+                return
+            for row in rows:
+                yield FileRecord(*row)
+
+    def __iter__(self):
+        return self._iter_range(0, self._length)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, end, step = key.indices(self._length)
+            if step != 1:
+                raise ValueError("Поддерживаются только срезы с шагом 1")
+            return list(self._iter_range(start, end))
+        position = key + self._length if key < 0 else key
+        if not 0 <= position < self._length:
+            raise IndexError(key)
+        return next(self._iter_range(position, position + 1))
+
+    def close(self):
+        """Закрыть соединение (временные таблицы удаляются)."""
+        self.conn.close()
@@ -0,0 +1,191 @@
+import os
+import json
+import fnmatch
+import shutil
+import hashlib
+import logging
+
+# Глобальные переменные
+MANIFEST_FILENAME = "manifest.json"
+PART_STATUS_DIR = "parts"  # Статусы частей по отдельности: их пишут воркеры разных машин
+MANIFEST_VERSION = 1
+DEDUP_REPORT_FILENAME = "dedup_report.json"  # Отброшенные дубликаты и их оставленные оригиналы
+RUN_REPORT_FILENAME = "run_report.json"  # Метрики последнего запуска (для шарда — run_report_shard_K_of_N.json)
+CHECKSUM_CHUNK_SIZE = 4 * 1024 * 1024  # Чтение по 4 МиБ при подсчёте SHA-256
+# Поля результата рендера части (переносятся при продолжении и инкрементальном рендере)
+PART_RESULT_KEYS = ("status", "output", "size", "sha256", "rendered")
+
+
+def files_digest(paths):
+    """Отпечаток упорядоченного списка файлов."""
+    digest = hashlib.sha1()
+    for path in paths:
+        digest.update(path.encode("utf-8", errors="surrogateescape"))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+def content_digest(rows):
+    """Отпечаток содержимого файлов: строки (путь, размер, mtime, текст наложения)."""
+    digest = hashlib.sha1()
+    for row in rows:
+        data = json.dumps(row, ensure_ascii=False, default=str)
+        digest.update(data.encode("utf-8", errors="surrogateescape"))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+def settings_digest(settings):
+    """Отпечаток настроек рендера (словарь значений)."""
+    data = json.dumps(settings, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+def file_sha256(path):
+    """Посчитать SHA-256 файла."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHECKSUM_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def manifest_path(output_dir):
+    """Путь к манифесту частей в папке результатов."""
+    return os.path.join(output_dir, MANIFEST_FILENAME)
+
+
+def load_manifest(output_dir):
+    """Загрузить манифест частей (None, если его нет или он повреждён)."""
+    path = manifest_path(output_dir)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != MANIFEST_VERSION:
+            logging.warning(f"Неподдерживаемая версия манифеста {path}: {manifest.get('version')}")
+            return None
+        return manifest
+    except Exception as e:
+        logging.error(f"Ошибка чтения манифеста {path}: {e}")
+        return None
+
+
+def _write_json_atomic(path, data):
+    """Атомарно записать JSON (запись во временный файл и замена)."""
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def save_manifest(output_dir, manifest):
+    """Атомарно сохранить манифест."""
+    _write_json_atomic(manifest_path(output_dir), manifest)
+
+
+def save_dedup_report(output_dir, report):
+    """Атомарно сохранить отчёт об отброшенных дубликатах и вернуть его путь."""
+    path = os.path.join(output_dir, DEDUP_REPORT_FILENAME)
+    _write_json_atomic(path, report)
+    return path
+
+
+def save_run_report(output_dir, report, shard=None):
+    """Атомарно сохранить отчёт запуска рядом с частями и вернуть его путь."""
+    filename = RUN_REPORT_FILENAME
+    if shard:
+        index, count = shard
+        filename = filename.replace(".json", f"_shard_{index}_of_{count}.json")
+    path = os.path.join(output_dir, filename)
+    _write_json_atomic(path, report)
+    return path
+
+
+def save_part_status(output_dir, part):
+    """Атомарно сохранить статус одной части в PART_STATUS_DIR."""
+    status_dir = os.path.join(output_dir, PART_STATUS_DIR)
+    os.makedirs(status_dir, exist_ok=True)
+    _write_json_atomic(os.path.join(status_dir, f"part_{part['part_number']:03d}.json"), part)
+
+
+def clear_part_statuses(output_dir):
+    """Удалить статусы частей (после перепланирования номера частей меняются)."""
+    shutil.rmtree(os.path.join(output_dir, PART_STATUS_DIR), ignore_errors=True)
+
+
+def clear_output_dir(output_dir, part_patterns):
+    """Очистить папку результатов от файлов прошлого запуска.
+
+    Папка считается своей, только если она пуста или в ней есть манифест;
+    иначе ничего не удаляется и возвращается False. Удаляются лишь файлы
+    частей (part_patterns и выходы из манифеста), временные файлы, манифест,
+    статусы и отчёты — остальное остаётся на месте.
+    """
+    if not os.path.isdir(output_dir):
+        return not os.path.exists(output_dir)
+    names = os.listdir(output_dir)
+    if names and MANIFEST_FILENAME not in names:
+        return False
+    patterns = list(part_patterns) + [MANIFEST_FILENAME, PART_STATUS_DIR, DEDUP_REPORT_FILENAME,
+                                      RUN_REPORT_FILENAME.replace(".json", "*.json"), "*.tmp", "*.renaming"]
+    outputs = {part.get("output") for part in (load_manifest(output_dir) or {}).get("parts", [])}
+    for name in names:
+        if name not in outputs and not any(fnmatch.fnmatch(name, pattern) for pattern in patterns):
+            logging.info(f"Оставлен посторонний файл: {os.path.join(output_dir, name)}")
+            continue
+        path = os.path.join(output_dir, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+    return True
+
+
+def load_part_statuses(output_dir):
+    """Загрузить статусы частей: {part_number: part}."""
+    status_dir = os.path.join(output_dir, PART_STATUS_DIR)
+    statuses = {}
+    if not os.path.isdir(status_dir):
+        return statuses
+    for name in sorted(os.listdir(status_dir)):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(status_dir, name), "r", encoding="utf-8") as f:
+                part = json.load(f)
+            statuses[part["part_number"]] = part
+        except Exception as e:
+            logging.error(f"Ошибка чтения статуса части {name}: {e}")
+    return statuses
+
+
+def mark_part_complete(part, output_path, rendered=None):
+    """Отметить часть завершённой: имя файла, размер и контрольная сумма.
+
+    rendered — что фактически попало в файл (photos, first_timestamp,
+    last_timestamp): пропущенные при рендере фото в плане не отражены.
+    """
+    part["status"] = "complete"
+    part["output"] = os.path.basename(output_path)
+    part["size"] = os.path.getsize(output_path)
+    part["sha256"] = file_sha256(output_path)
+    if rendered:
+        part["rendered"] = dict(rendered)
+
+
+def is_part_complete(part, output_dir, verify_checksum=True):
+    """Проверить, что часть завершена и её файл не повреждён."""
+    if part.get("status") != "complete" or not part.get("output"):
+        return False
+    path = os.path.join(output_dir, part["output"])
+    if not os.path.exists(path) or os.path.getsize(path) != part.get("size"):
+        logging.warning(f"Файл части {part['part_number']} отсутствует или изменён: {path}")
+        return False
+    if verify_checksum and file_sha256(path) != part.get("sha256"):
+        logging.warning(f"Контрольная сумма части {part['part_number']} не совпадает: {path}")
+        return False
+    return True
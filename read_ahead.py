@@ -0,0 +1,134 @@
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Глобальные переменные
+READ_AHEAD_BATCH_FILES = 32  # Файлов в одной порции чтения (внутри порции — по каталогам)
+
+
+class ReadAhead:
+    """Упреждающее чтение файлов в память впереди курсора рендера.
+
+    Фоновый поток идёт по файлам в порядке рендера и читает их байты в
+    workers потоках, пока прочитанное, но ещё не взятое не превышает
+    max_bytes. Внутри порции файлы читаются по каталогам и именам, чтобы
+    доступ к диску был последовательным, а несколько запросов в полёте
+    скрывали задержку USB-дисков и сетевых папок. Потребители берут байты
+    через take() в том же порядке; каждый переданный путь нужно взять
+    ровно один раз, иначе его место в бюджете не освободится.
+
+    items — пары (путь, размер в байтах; None — узнать через stat).
+    skip(path) — не читать файл (например, кадр уже есть в кэше).
+    """
+
+    def __init__(self, items, max_bytes, workers=4, skip=None):
+        self._items = list(items)
+        self._expected = {path for path, _ in self._items}
+        self._max_bytes = max_bytes
+        self._skip = skip
+        self._cond = threading.Condition()
+        self._data = {}  # путь -> байты (None — не прочитан или пропущен)
+        self._reserved = {}  # путь -> байты, занятые в бюджете
+        self._buffered = 0
+        self._closed = False
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers))
+        self._thread = threading.Thread(target=self._schedule, daemon=True)
+        self._thread.start()
+
+    def _has_room(self, size):
+        """Помещается ли файл в бюджет (один файл читается всегда)."""
+        return not self._buffered or self._buffered + size <= self._max_bytes
+
+    def _should_skip(self, path):
+        """Проверить skip(path); при ошибке файл читается как обычно."""
+        if not self._skip:
+            return False
+        try:
+            return self._skip(path)
+        except Exception as e:
+            logging.debug(f"Проверка перед упреждающим чтением не удалась {path}: {e}")
+            return False
+
+    def _schedule(self):
+        """Распределить файлы по порциям чтения в пределах бюджета."""
+        batch = []
+        try:
+            for path, size in self._items:
+                if self._should_skip(path):
+                    self._store(path, None)
+                    continue
+                if size is None:
+                    try:
+                        size = os.path.getsize(path)
+                    except OSError:
+                        size = 0
+                with self._cond:
+                    room = self._has_room(size)
+                if batch and (len(batch) >= READ_AHEAD_BATCH_FILES or not room):
+                    self._submit(batch)
+                    batch = []
+                with self._cond:
+                    while not self._closed and not self._has_room(size):
+                        self._cond.wait()
+                    if self._closed:
+                        return
+                    self._buffered += size
+                    self._reserved[path] = size
+                batch.append(path)
+            if batch:
+                self._submit(batch)
+        except Exception as e:
+            logging.error(f"Ошибка упреждающего чтения: {e}")
+            self.close()
+
+    def _submit(self, batch):
+        """Отправить порцию на чтение, упорядочив её по каталогам."""
+        for path in sorted(batch, key=lambda path: (os.path.dirname(path), os.path.basename(path))):
+            self._executor.submit(self._read, path)
+
+    def _read(self, path):
+        """Прочитать файл целиком."""
+        if self._closed:
+            return
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError as e:
+            logging.debug(f"Упреждающее чтение не удалось {path}: {e}")
+            data = None
+        self._store(path, data)
+
+    def _store(self, path, data):
+        """Сохранить результат чтения и разбудить ожидающих."""
+        with self._cond:
+            if not self._closed:
+                self._data[path] = data
+            self._cond.notify_all()
+
+    def take(self, path):
+        """Байты файла (дождаться чтения) или None — читать с диска напрямую."""
+        with self._cond:
+            if path not in self._expected:
+                return None
+            while path not in self._data and not self._closed:
+                self._cond.wait()
+            self._expected.discard(path)
+            data = self._data.pop(path, None)
+            self._buffered -= self._reserved.pop(path, 0)
+            self._cond.notify_all()
+        return data
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Остановить чтение и освободить буферы."""
+        with self._cond:
+            self._closed = True
+            self._data.clear()
+            self._cond.notify_all()
+        self._executor.shutdown(wait=False, cancel_futures=True)
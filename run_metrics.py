@@ -0,0 +1,153 @@
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+import psutil
+
+# Глобальные переменные
+MEMORY_SAMPLE_INTERVAL = 1.0  # Не чаще раза в секунду запрашивать RSS процесса
+PROGRESS_LOG_INTERVAL = 30.0  # Секунд между строками прогресса части
+PROGRESS_WINDOW = 60.0  # Окно (секунд) для скользящей скорости фото/с
+
+
+class RunMetrics:
+    """Суммарные таймеры и счётчики этапов запуска.
+
+    Таймеры потокобезопасны: этапы подготовки кадров выполняются в пуле
+    потоков, поэтому их время суммируется по всем потокам. Память
+    процесса замеряется выборочно, не чаще MEMORY_SAMPLE_INTERVAL.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._process = psutil.Process()
+        self._last_sample = 0.0
+        self.timers = {}
+        self.counters = {}
+        self.rss_mb = 0.0
+        self.peak_rss_mb = 0.0
+
+    def add_time(self, stage, seconds):
+        """Добавить время к этапу."""
+        with self._lock:
+            self.timers[stage] = self.timers.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def timer(self, stage):
+        """Замерить время блока и добавить его к этапу."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - start)
+
+    def count(self, name, value=1):
+        """Увеличить счётчик."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def sample_memory(self, force=False):
+        """Замерить RSS процесса, если с прошлого замера прошло достаточно времени."""
+        now = time.monotonic()
+        if not force and now - self._last_sample < MEMORY_SAMPLE_INTERVAL:
+            return self.rss_mb
+        self._last_sample = now
+        rss_mb = self._process.memory_info().rss / 1024 / 1024
+        with self._lock:
+            self.rss_mb = rss_mb
+            self.peak_rss_mb = max(self.peak_rss_mb, rss_mb)
+        return rss_mb
+
+    def snapshot(self):
+        """Текущие значения метрик (словарь для JSON)."""
+        self.sample_memory(force=True)
+        with self._lock:
+            return {
+                "timers": {stage: round(seconds, 3) for stage, seconds in self.timers.items()},
+                "counters": dict(self.counters),
+                "peak_rss_mb": round(self.peak_rss_mb, 1),
+            }
+
+    def since(self, snapshot):
+        """Метрики, накопленные после snapshot (для отчёта по одной части)."""
+        current = self.snapshot()
+        timers = {stage: round(seconds - snapshot["timers"].get(stage, 0.0), 3)
+                  for stage, seconds in current["timers"].items()}
+        counters = {name: value - snapshot["counters"].get(name, 0)
+                    for name, value in current["counters"].items()}
+        return {
+            "timers": {stage: seconds for stage, seconds in timers.items() if seconds},
+            "counters": {name: value for name, value in counters.items() if value},
+            "peak_rss_mb": current["peak_rss_mb"],
+        }
+
+    def merge(self, snapshot):
+        """Добавить метрики другого процесса (параллельный рендер частей)."""
+        with self._lock:
+            for stage, seconds in snapshot.get("timers", {}).items():
+                self.timers[stage] = self.timers.get(stage, 0.0) + seconds
+            for name, value in snapshot.get("counters", {}).items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            # Пик памяти — по самому «тяжёлому» процессу, а не сумма
+            self.peak_rss_mb = max(self.peak_rss_mb, snapshot.get("peak_rss_mb", 0.0))
+
+
+class PartProgress:
+    """Прогресс рендера части: скользящая скорость фото/с и оценка оставшегося времени."""
+
+    def __init__(self, part_number, total, metrics):
+        self.part_number = part_number
+        self.total = total
+        self.metrics = metrics
+        self.done = 0
+        self.started = time.monotonic()
+        self._last_log = self.started
+        self._window = deque([(self.started, 0)])
+
+    def rate(self):
+        """Фото/с за последние PROGRESS_WINDOW секунд."""
+        now = time.monotonic()
+        while len(self._window) > 1 and now - self._window[0][0] > PROGRESS_WINDOW:
+            self._window.popleft()
+        first_time, first_done = self._window[0]
+        elapsed = now - first_time
+        return (self.done - first_done) / elapsed if elapsed > 0 else 0.0
+
+    def advance(self, photos=1):
+        """Отметить обработанные фото; раз в PROGRESS_LOG_INTERVAL вывести прогресс."""
+        self.done += photos
+        now = time.monotonic()
+        self._window.append((now, self.done))
+        rss_mb = self.metrics.sample_memory()
+        if now - self._last_log < PROGRESS_LOG_INTERVAL:
+            return
+        self._last_log = now
+        rate = self.rate()
+        remaining = max(0, self.total - self.done)
+        eta = format_duration(remaining / rate) if rate > 0 else "?"
+        logging.info(f"Часть {self.part_number}: {self.done}/{self.total} фото, {rate:.1f} фото/с, "
+                     f"осталось ~{eta}, память {rss_mb:.0f} MiB")
+
+    def summary(self):
+        """Итог части: число фото, время и средняя скорость."""
+        seconds = time.monotonic() - self.started
+        return {
+            "photos": self.done,
+            "seconds": round(seconds, 3),
+            "photos_per_second": round(self.done / seconds, 2) if seconds > 0 else None,
+        }
+
+
+def format_duration(seconds):
+    """Длительность для логов: "1 ч 05 мин", "3 мин 20 с", "12 с"."""
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600} ч {seconds % 3600 // 60:02d} мин"
+    if seconds >= 60:
+        return f"{seconds // 60} мин {seconds % 60:02d} с"
+    return f"{seconds} с"
+
+
+# Метрики текущего процесса (у каждого процесса рендера — свои)
+METRICS = RunMetrics()
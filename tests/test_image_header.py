@@ -0,0 +1,99 @@
+import os
+import sys
+import struct
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from PIL import Image, TiffImagePlugin
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image_header import EMPTY_HEADER, ImageHeader, parse_exif_datetime, read_image_header
+
+TAKEN = "2020:05:17 14:30:00"
+TAKEN_UTC3 = int(datetime(2020, 5, 17, 14, 30, tzinfo=timezone(timedelta(hours=3))).timestamp())
+TAKEN_LOCAL = int(datetime(2020, 5, 17, 14, 30).timestamp())
+
+
+def make_exif(date=TAKEN, offset="+03:00", orientation=6):
+    """EXIF с ориентацией в IFD0 и DateTimeOriginal/OffsetTimeOriginal в Exif IFD."""
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    exif_ifd = exif.get_ifd(0x8769)
+    exif_ifd[0x9003] = date
+    if offset:
+        exif_ifd[0x9011] = offset
+    return exif
+
+
+def save_image(path, image_format, **params):
+    """Сохранить картинку 64x48 в нужном формате и вернуть путь."""
+    Image.new("RGB", (64, 48), (10, 20, 30)).save(path, image_format, **params)
+    return str(path)
+
+
+@pytest.mark.parametrize("image_format", ["JPEG", "PNG"])
+def test_exif_date_offset_and_orientation(tmp_path, image_format):
+    path = save_image(tmp_path / f"photo.{image_format.lower()}", image_format, exif=make_exif())
+    assert read_image_header(path) == ImageHeader(64, 48, TAKEN_UTC3, 6)
+
+
+def test_exif_date_without_offset_is_local_time(tmp_path):
+    path = save_image(tmp_path / "photo.jpg", "JPEG", exif=make_exif(offset=None, orientation=1))
+    assert read_image_header(path) == ImageHeader(64, 48, TAKEN_LOCAL, 1)
+
+
+def test_tiff_reads_exif_ifd(tmp_path):
+    info = TiffImagePlugin.ImageFileDirectory_v2()
+    info[0x0112] = 8
+    info[0x8769] = {0x9003: TAKEN, 0x9011: "+03:00"}
+    path = save_image(tmp_path / "photo.tiff", "TIFF", tiffinfo=info)
+    assert read_image_header(path) == ImageHeader(64, 48, TAKEN_UTC3, 8)
+
+
+@pytest.mark.parametrize("image_format", ["GIF", "BMP", "JPEG", "PNG", "TIFF"])
+def test_size_without_exif(tmp_path, image_format):
+    path = save_image(tmp_path / f"photo.{image_format.lower()}", image_format)
+    assert read_image_header(path) == ImageHeader(64, 48, None, 1)
+
+
+def test_zero_date_keeps_size(tmp_path):
+    path = save_image(tmp_path / "photo.jpg", "JPEG", exif=make_exif(date="0000:00:00 00:00:00", offset=None))
+    assert read_image_header(path) == ImageHeader(64, 48, None, 6)
+    assert parse_exif_datetime("0000:00:00 00:00:00") is None
+    assert parse_exif_datetime("") is None
+
+
+@pytest.mark.parametrize("image_format, size", [("JPEG", 20), ("PNG", 12), ("TIFF", 10), ("GIF", 7), ("BMP", 20)])
+def test_truncated_file_returns_empty_header(tmp_path, image_format, size):
+    path = save_image(tmp_path / f"photo.{image_format.lower()}", image_format)
+    with open(path, "rb") as f:
+        data = f.read(size)
+    with open(path, "wb") as f:
+        f.write(data)
+    assert read_image_header(path) == EMPTY_HEADER
+
+
+def test_oversized_ifd_count_returns_empty_header(tmp_path):
+    path = tmp_path / "broken.tiff"
+    path.write_bytes(b"II*\0" + struct.pack("<IH", 8, 0xFFFF) + b"\0" * 64)
+    assert read_image_header(str(path)) == EMPTY_HEADER
+
+
+def test_broken_exif_in_jpeg_keeps_size(tmp_path):
+    path = save_image(tmp_path / "photo.jpg", "JPEG", exif=make_exif())
+    with open(path, "rb") as f:
+        data = bytearray(f.read())
+    # Число записей IFD0 сразу после заголовка TIFF (Exif\0\0 + II*\0 + смещение 8)
+    ifd0 = data.index(b"Exif\0\0") + 6 + 8
+    data[ifd0:ifd0 + 2] = struct.pack("<H", 0xFFFF)
+    with open(path, "wb") as f:
+        f.write(data)
+    assert read_image_header(path) == ImageHeader(64, 48, None, 1)
+
+
+def test_unknown_format_and_missing_file(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_bytes(b"not an image")
+    assert read_image_header(str(path)) == EMPTY_HEADER
+    assert read_image_header(str(tmp_path / "missing.jpg")) == EMPTY_HEADER
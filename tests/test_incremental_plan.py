@@ -0,0 +1,104 @@
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import create_chronological_video as ccv
+from metadata_index import FileRecord
+from part_manifest import mark_part_complete
+
+PLAN_OPTIONS = {"max_clips": 3, "max_size_mb": None, "split_by": None}
+
+
+def make_record(name, day):
+    """Запись индекса для фото name, снятого 2020-01-day."""
+    return FileRecord(f"/archive/{name}.jpg", 1000, 1, None, datetime(2020, 1, day, 12).timestamp(),
+                      "filename", None, None, 1920, 1080)
+
+
+def render_fake_parts(parts, records, output_dir, skipped=None):
+    """Пометить части готовыми с файлами-заглушками; skipped — {номер части: число пропущенных фото с конца}."""
+    for part in parts:
+        part_records = records[part["start"]:part["end"]]
+        part_records = part_records[:len(part_records) - (skipped or {}).get(part["part_number"], 0)]
+        rendered = {"photos": len(part_records), "first_timestamp": part_records[0].timestamp,
+                    "last_timestamp": part_records[-1].timestamp}
+        path = ccv.build_output_path(output_dir, part["part_number"], rendered["first_timestamp"],
+                                     rendered["last_timestamp"], rendered["photos"])
+        with open(path, "wb") as f:
+            f.write(b"part %d" % part["part_number"])
+        mark_part_complete(part, path, rendered)
+
+
+def test_incremental_plan_keeps_parts_and_renames_by_rendered_photos(tmp_path):
+    output_dir = str(tmp_path)
+    records = [make_record(f"p{day}", day) for day in range(1, 10)]
+    parts = ccv.plan_parts(records, output_dir, **PLAN_OPTIONS)
+    assert [(part["start"], part["end"]) for part in parts] == [(0, 3), (3, 6), (6, 9)]
+    # В части 2 последнее фото не удалось прочитать: в файле 2 фото, а не 3
+    render_fake_parts(parts, records, output_dir, skipped={2: 1})
+    assert parts[1]["output"] == "2020-01-04_2020-01-05_2-photos_002.mp4"
+    previous = ccv.build_manifest("/archive", records, parts)
+
+    # Новое фото в отрезке части 1 делит её на две — прошлые части 2 и 3 сдвигаются
+    new_records = sorted(records + [make_record("p2b", 2)], key=lambda record: record.timestamp)
+    new_parts, reused = ccv.plan_parts_incremental(new_records, "/archive", previous,
+                                                   output_dir=output_dir, **PLAN_OPTIONS)
+    assert reused == 2
+    assert [part["part_number"] for part in new_parts] == [1, 2, 3, 4]
+    assert [part["status"] for part in new_parts] == ["pending", "pending", "complete", "complete"]
+
+    ccv.reuse_part_files(output_dir, previous, new_parts)
+    assert new_parts[2]["output"] == "2020-01-04_2020-01-05_2-photos_003.mp4"
+    assert new_parts[3]["output"] == "2020-01-07_2020-01-09_3-photos_004.mp4"
+    assert sorted(os.listdir(output_dir)) == ["2020-01-04_2020-01-05_2-photos_003.mp4",
+                                              "2020-01-07_2020-01-09_3-photos_004.mp4"]
+    with open(os.path.join(output_dir, new_parts[2]["output"]), "rb") as f:
+        assert f.read() == b"part 2"
+
+
+def test_incremental_plan_without_rendered_stats_keeps_only_unmoved_parts(tmp_path):
+    output_dir = str(tmp_path)
+    records = [make_record(f"p{day}", day) for day in range(1, 10)]
+    parts = ccv.plan_parts(records, output_dir, **PLAN_OPTIONS)
+    render_fake_parts(parts, records, output_dir)
+    # Манифест до появления "rendered": имя под новым номером построить не из чего
+    for part in parts:
+        del part["rendered"]
+    previous = ccv.build_manifest("/archive", records, parts)
+
+    new_records = sorted(records + [make_record("p8b", 8)], key=lambda record: record.timestamp)
+    new_parts, reused = ccv.plan_parts_incremental(new_records, "/archive", previous,
+                                                   output_dir=output_dir, **PLAN_OPTIONS)
+    assert reused == 2
+    assert [part["status"] for part in new_parts] == ["complete", "complete", "pending", "pending"]
+
+    new_records = sorted(records + [make_record("p2b", 2)], key=lambda record: record.timestamp)
+    new_parts, reused = ccv.plan_parts_incremental(new_records, "/archive", previous,
+                                                   output_dir=output_dir, **PLAN_OPTIONS)
+    assert reused == 0
+
+
+def test_changed_content_is_not_resumed_and_rerenders_only_its_part(tmp_path):
+    output_dir = str(tmp_path)
+    records = [make_record(f"p{day}", day) for day in range(1, 10)]
+    parts = ccv.plan_parts(records, output_dir, **PLAN_OPTIONS)
+    render_fake_parts(parts, records, output_dir)
+    previous = ccv.build_manifest("/archive", records, parts)
+
+    # Те же пути: у одного фото сменился текст наложения (правка JSON), у другого — mtime
+    for index, change in ((4, {"text": "2020-01-05 12:00:00 Paris"}), (7, {"mtime_ns": 2})):
+        changed = list(records)
+        changed[index] = changed[index]._replace(**change)
+        new_parts = ccv.plan_parts(changed, output_dir, **PLAN_OPTIONS)
+        manifest = ccv.build_manifest("/archive", changed, new_parts)
+        assert manifest["files_digest"] == previous["files_digest"]
+        assert not ccv.restore_progress(manifest, previous)
+
+        new_parts, reused = ccv.plan_parts_incremental(changed, "/archive", previous,
+                                                       output_dir=output_dir, **PLAN_OPTIONS)
+        assert reused == 2
+        expected = ["complete"] * 3
+        expected[index // 3] = "pending"
+        assert [part["status"] for part in new_parts] == expected
@@ -0,0 +1,119 @@
+import logging
+import threading
+from collections import namedtuple, OrderedDict
+from functools import lru_cache
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# Глобальные переменные
+SPRITE_CACHE_MAX_BYTES = 8 * 1024 * 1024  # Бюджет LRU-кэша спрайтов текста (подписи с секундами и
+                                          # координатами почти всегда разные: кэш помогает лишь повторам)
+
+# Готовый к наложению текст: rgba — спрайт (uint8), offset — сдвиг спрайта
+# относительно точки привязки текста, text_size — размер текста без обводки (для позиционирования)
+TextSprite = namedtuple("TextSprite", ["rgba", "offset_x", "offset_y", "text_width", "text_height"])
+
+_sprite_cache = OrderedDict()  # ключ -> TextSprite, в порядке последнего использования
+_sprite_cache_bytes = 0
+_sprite_cache_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def load_font(font_type, font_size):
+    """Загрузить шрифт один раз на процесс."""
+    try:
+        return ImageFont.truetype(font_type, font_size)
+    except Exception as e:
+        logging.warning(f"Шрифт {font_type} недоступен, используется стандартный: {e}")
+        return ImageFont.load_default()
+
+
+def render_text_sprite(text, font_type, font_size, text_color, stroke_color, stroke_width):
+    """Спрайт текста из кэша (не больше SPRITE_CACHE_MAX_BYTES) или отрисованный заново."""
+    global _sprite_cache_bytes
+    key = (text, font_type, font_size, text_color, stroke_color, stroke_width)
+    with _sprite_cache_lock:
+        sprite = _sprite_cache.get(key)
+        if sprite is not None:
+            _sprite_cache.move_to_end(key)
+            return sprite
+    sprite = _render_text_sprite(text, font_type, font_size, text_color, stroke_color, stroke_width)
+    if sprite.rgba.nbytes <= SPRITE_CACHE_MAX_BYTES:
+        with _sprite_cache_lock:
+            if key not in _sprite_cache:
+                _sprite_cache[key] = sprite
+                _sprite_cache_bytes += sprite.rgba.nbytes
+            while _sprite_cache_bytes > SPRITE_CACHE_MAX_BYTES:
+                _, evicted = _sprite_cache.popitem(last=False)
+                _sprite_cache_bytes -= evicted.rgba.nbytes
+    return sprite
+
+
+def _render_text_sprite(text, font_type, font_size, text_color, stroke_color, stroke_width):
+    """Отрисовать текст с обводкой в небольшой RGBA-спрайт."""
+    font = load_font(font_type, font_size)
+    measure = ImageDraw.Draw(Image.new("L", (1, 1)))
+    bbox = measure.textbbox((0, 0), text, font=font)
+    stroke_bbox = measure.textbbox((0, 0), text, font=font, stroke_width=stroke_width)
+    width = max(1, stroke_bbox[2] - stroke_bbox[0])
+    height = max(1, stroke_bbox[3] - stroke_bbox[1])
+
+    sprite = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    ImageDraw.Draw(sprite).text((-stroke_bbox[0], -stroke_bbox[1]), text, font=font, fill=tuple(text_color),
+                                stroke_width=stroke_width, stroke_fill=tuple(stroke_color))
+    rgba = np.array(sprite, dtype=np.uint8)
+    # Спрайты общие для всех кадров: защищаем от случайного изменения
+    rgba.flags.writeable = False
+    return TextSprite(rgba, stroke_bbox[0], stroke_bbox[1], bbox[2] - bbox[0], bbox[3] - bbox[1])
+
+
+def get_text_anchor(image_size, text_size, text_position):
+    """Рассчитать точку привязки текста по TEXT_POSITION (как в Pillow draw.text)."""
+    img_width, img_height = image_size
+    text_width, text_height = text_size
+
+    if text_position[0] == "center":
+        x = (img_width - text_width) // 2
+    elif text_position[0] == "right":
+        x = img_width - text_width
+    else:
+        x = text_position[0]
+
+    if isinstance(text_position[1], str) and text_position[1].startswith("bottom-"):
+        offset = int(text_position[1].split("-")[1])
+        y = img_height - text_height - offset
+    else:
+        y = text_position[1]
+    return x, y
+
+
+def draw_text_overlay(image, text, font_type, font_size, text_position, text_color,
+                      stroke_color, stroke_width):
+    """Наложить текст на RGB-кадр на месте: меняется только область спрайта."""
+    if not text:
+        return image
+    sprite = render_text_sprite(text, font_type, font_size, tuple(text_color),
+                                tuple(stroke_color), stroke_width)
+    img_height, img_width = image.shape[:2]
+    x, y = get_text_anchor((img_width, img_height), (sprite.text_width, sprite.text_height), text_position)
+    x += sprite.offset_x
+    y += sprite.offset_y
+
+    # Обрезка спрайта по границам кадра
+    sprite_height, sprite_width = sprite.rgba.shape[:2]
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + sprite_width, img_width), min(y + sprite_height, img_height)
+    if x0 >= x1 or y0 >= y1:
+        return image
+    sx, sy = x0 - x, y0 - y
+    rgba = sprite.rgba[sy:sy + (y1 - y0), sx:sx + (x1 - x0)]
+    alpha = rgba[..., 3:].astype(np.uint16)
+
+    # out = (rgb * a + dst * (255 - a)) / 255, сумма не превышает 255 * 255 и помещается в uint16
+    region = image[y0:y1, x0:x1]
+    blended = region * (255 - alpha)
+    blended += rgba[..., :3] * alpha
+    blended += 127
+    blended //= 255
+    region[...] = blended
+    return image